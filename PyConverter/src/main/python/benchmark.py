@@ -0,0 +1,176 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import PIL
+from PIL import Image
+
+from package.converter import Converter, DEFAULT_WORKERS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SAMPLE_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "..", "..", "..", "..", "_sample_images", "mountain.jpg")
+RESOLUTIONS = {"vga": (640, 480), "hd": (1920, 1080), "12mp": (4000, 3000)}
+FILTERS = {"nearest": Image.NEAREST, "bilinear": Image.BILINEAR,
+           "bicubic": Image.BICUBIC, "antialias": Image.LANCZOS}
+DEFAULT_CASE = {"source": "hd", "size": 0.5, "quality": 75, "filter": "antialias",
+                "mode": "exact", "workers": 1}
+SWEEPS = {"source": list(RESOLUTIONS) + ["mountain"],
+          "size": [0.25, 0.5, 1.0],
+          "quality": [50, 75, 95],
+          "filter": list(FILTERS),
+          "mode": ["exact", "fast"],
+          "workers": sorted({1, 2, 4, DEFAULT_WORKERS})}
+
+
+def create_sources(directory, count):
+    # Deterministic content: a fractal plus two gradients, so JPEG encoding
+    # has real detail to work on and runs are comparable between machines
+    sources = {}
+    for name, size in RESOLUTIONS.items():
+        red = Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 64)
+        green = Image.linear_gradient("L").resize(size)
+        blue = Image.radial_gradient("L").resize(size)
+        image = Image.merge("RGB", (red, green, blue))
+        sources[name] = _copies(image, os.path.join(directory, name), count)
+
+    with Image.open(SAMPLE_IMAGE) as image:
+        sources["mountain"] = _copies(image, os.path.join(directory, "mountain"), count)
+    return sources
+
+
+def _copies(image, directory, count):
+    os.makedirs(directory)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"{index:03d}.jpg")
+        image.save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def iter_cases():
+    seen = set()
+    for parameter, values in SWEEPS.items():
+        for value in values:
+            case = dict(DEFAULT_CASE, **{parameter: value})
+            key = case_key(case)
+            if key not in seen:
+                seen.add(key)
+                yield case
+
+
+def case_key(case):
+    return ",".join(f"{name}={case[name]}" for name in DEFAULT_CASE)
+
+
+def run_case(case, paths, repeat):
+    # Runs in a fresh process so that the peak RSS belongs to this case only
+    input_bytes = sum(os.path.getsize(path) for path in paths)
+    folder = f"bench_{os.getpid()}"
+    timings = []
+    for _ in range(repeat):
+        converter = Converter(size=case["size"],
+                              quality=case["quality"],
+                              folder=folder,
+                              mode=case["mode"],
+                              workers=case["workers"],
+                              resample=FILTERS[case["filter"]],
+                              use_cache=False)
+        start = time.perf_counter()
+        results = list(converter.convert(paths))
+        timings.append(time.perf_counter() - start)
+        if not all(result["success"] for result in results):
+            raise RuntimeError(f"La conversion a échoué pour {case_key(case)}")
+        shutil.rmtree(os.path.join(os.path.dirname(paths[0]), folder))
+
+    best = min(timings)
+    return {"case": case,
+            "seconds": round(best, 4),
+            "images_per_sec": round(len(paths) / best, 2),
+            "mb_per_sec": round(input_bytes / best / 1e6, 2),
+            "peak_rss_mb": _peak_rss_mb()}
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return round(peak / 1e6, 1)
+    return round(peak / 1e3, 1)
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, "r") as f:
+        baseline = {case_key(result["case"]): result for result in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\nComparaison avec {baseline_path}")
+    for result in results:
+        previous = baseline.get(case_key(result["case"]))
+        if not previous:
+            continue
+        ratio = result["images_per_sec"] / previous["images_per_sec"]
+        regressed = ratio < 1 - threshold
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{case_key(result['case']):<85} x{ratio:.2f}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure le débit de conversion de CustomImage.")
+    parser.add_argument("-n", "--count", type=int, default=8, help="Images par cas (défaut: 8).")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Répétitions par cas, la meilleure est gardée.")
+    parser.add_argument("-o", "--output", help="Enregistre les résultats dans ce fichier JSON.")
+    parser.add_argument("-b", "--baseline", help="Fichier JSON de référence à comparer.")
+    parser.add_argument("-t", "--threshold", type=float, default=0.1,
+                        help="Baisse de débit tolérée avant de signaler une régression (défaut: 0.1).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    directory = tempfile.mkdtemp(prefix="pyconverter_bench_")
+    try:
+        sources = create_sources(directory, args.count)
+        results = []
+        print(f"{'cas':<85} {'img/s':>8} {'MB/s':>8} {'RSS MB':>8}")
+        for case in iter_cases():
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                result = executor.submit(run_case, case, sources[case["source"]], args.repeat).result()
+            results.append(result)
+            print(f"{case_key(case):<85} {result['images_per_sec']:>8} "
+                  f"{result['mb_per_sec']:>8} {result['peak_rss_mb']!s:>8}")
+    finally:
+        shutil.rmtree(directory)
+
+    if args.output:
+        data = {"python": platform.python_version(),
+                "pillow": PIL.__version__,
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "count": args.count,
+                "results": results}
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=4)
+
+    if args.baseline:
+        return 1 if compare(results, args.baseline, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
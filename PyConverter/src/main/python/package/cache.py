@@ -0,0 +1,85 @@
+import os
+import json
+import logging
+import threading
+
+MANIFEST_FILENAME = ".pyconverter.jsonl"
+
+
+class ConversionCache:
+    # Each output folder holds a JSON-lines manifest of the conversions written
+    # into it. A line records the source signature (size + mtime) and the
+    # conversion parameters; the last line for a given source wins.
+    def __init__(self):
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    def is_up_to_date(self, image, params, signature=None, output_paths=None):
+        entry = self._manifest(image).get(os.path.abspath(image.path))
+        if not entry:
+            return False
+
+        return (entry["signature"] == (signature or self.signature(image.path))
+                and entry["params"] == params
+                and all(os.path.exists(path) for path in output_paths or [image.reduced_path]))
+
+    def add(self, image, params, signature=None):
+        entry = {"source": os.path.abspath(image.path),
+                 "signature": signature or self.signature(image.path),
+                 "params": params}
+        manifest = self._manifest(image)
+        with self._lock:
+            manifest[entry["source"]] = entry
+            with open(self.manifest_path(image), "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    @staticmethod
+    def signature(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def manifest_path(image):
+        return os.path.join(os.path.dirname(image.reduced_path), MANIFEST_FILENAME)
+
+    def _manifest(self, image):
+        manifest_path = self.manifest_path(image)
+        with self._lock:
+            if manifest_path not in self._manifests:
+                self._manifests[manifest_path] = self._load(manifest_path)
+            return self._manifests[manifest_path]
+
+    @staticmethod
+    def _load(manifest_path):
+        entries = {}
+        if not os.path.exists(manifest_path):
+            return entries
+
+        line_count = 0
+        with open(manifest_path, "r") as f:
+            for line in f:
+                line_count += 1
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logging.warning(f"Ligne invalide ignorée dans {manifest_path}")
+                    continue
+                entries[entry["source"]] = entry
+
+        # Drop superseded lines once they make up most of the file
+        if line_count > 2 * len(entries):
+            tmp_path = manifest_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for entry in entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, manifest_path)
+
+        return entries
+
+
+def mark_output_folder(folder):
+    # An empty manifest marks the other output folders too, so that none of
+    # them is converted again when the source folder is walked
+    path = os.path.join(folder, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        open(path, "a").close()
@@ -0,0 +1,127 @@
+import sys
+import json
+import time
+import argparse
+
+from package.converter import Converter, DEFAULT_MEMORY_BUDGET, DEFAULT_WORKERS, PRESETS
+from package.encoders import DEFAULT_ENCODER, available_encoders
+from package.image import QUALITY_MODES, compare_encoders
+from package.stats import RunReport
+from package.walker import iter_images
+
+PROGRESS_INTERVAL = 1.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="pyconverter",
+                                     description="Réduit des images sans interface graphique.")
+    parser.add_argument("inputs", nargs="+", help="Fichiers, dossiers ou motifs glob à convertir.")
+    parser.add_argument("-s", "--size", type=int, default=50, help="Taille en pourcentage (défaut: 50).")
+    parser.add_argument("-q", "--quality", type=int, default=75, help="Qualité JPEG (défaut: 75).")
+    parser.add_argument("-o", "--folder", default="reduced", help="Dossier de sortie (défaut: reduced).")
+    parser.add_argument("-p", "--preset", choices=PRESETS,
+                        help="Produit plusieurs tailles en un seul décodage (remplace --size, --quality et --folder).")
+    parser.add_argument("-f", "--format", choices=available_encoders(), default=DEFAULT_ENCODER)
+    parser.add_argument("--encoder-option", action="append", default=[], metavar="CLE=VALEUR",
+                        help="Option transmise à l'encodeur Pillow, par exemple method=6 (répétable).")
+    parser.add_argument("--compare-formats", action="store_true",
+                        help="Compare le poids et la durée d'encodage de chaque format sans rien écrire.")
+    parser.add_argument("-m", "--mode", choices=QUALITY_MODES, default="exact")
+    parser.add_argument("--max-kb", type=int, help="Poids maximal de chaque image en Ko, la qualité est ajustée.")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_BUDGET // 2 ** 20,
+                        help="Mémoire maximale occupée par les images en cours de conversion, en Mo.")
+    parser.add_argument("--no-recursive", action="store_true", help="Ne parcourt pas les sous-dossiers.")
+    parser.add_argument("--no-cache", action="store_true", help="Reconvertit les images déjà à jour.")
+    parser.add_argument("--report", help="Mesure chaque étape et enregistre un rapport (.json ou .csv).")
+    return parser.parse_args(argv)
+
+
+def parse_encoder_options(options):
+    parsed = {}
+    for option in options:
+        key, separator, value = option.partition("=")
+        if not separator:
+            raise SystemExit(f"Option d'encodeur invalide : {option}")
+        if value.lower() in ("true", "false"):
+            parsed[key] = value.lower() == "true"
+        else:
+            try:
+                parsed[key] = int(value)
+            except ValueError:
+                parsed[key] = value
+    return parsed
+
+
+def emit(event, **data):
+    sys.stdout.write(json.dumps({"event": event, **data}) + "\n")
+    sys.stdout.flush()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    encoder_options = parse_encoder_options(args.encoder_option)
+    if args.compare_formats:
+        paths = iter_images(args.inputs, recursive=not args.no_recursive, exclude={args.folder})
+        comparison = compare_encoders(paths, size=args.size / 100.0, quality=args.quality,
+                                      mode=args.mode, options=encoder_options)
+        for result in comparison["results"]:
+            emit("format", **result)
+        emit("comparison", input_bytes=comparison["input_bytes"], reference=comparison["reference"])
+        return 0
+
+    converter = Converter(size=args.size / 100.0,
+                          quality=args.quality,
+                          folder=args.folder,
+                          mode=args.mode,
+                          workers=args.workers,
+                          use_cache=not args.no_cache,
+                          max_bytes=args.max_kb * 1024 if args.max_kb else None,
+                          outputs=PRESETS.get(args.preset),
+                          instrument=bool(args.report),
+                          memory_budget=args.memory_mb * 2 ** 20,
+                          encoder=args.format,
+                          encoder_options=encoder_options)
+
+    # Output folders are skipped so that outputs are never converted again
+    exclude = {output["folder"] for output in converter.outputs}
+    paths = iter_images(args.inputs, recursive=not args.no_recursive, exclude=exclude)
+    counts = {"converted": 0, "skipped": 0, "failed": 0}
+    report = RunReport() if args.report else None
+    start = last_progress = time.monotonic()
+    try:
+        for result in converter.convert(paths):
+            if not result["success"]:
+                counts["failed"] += 1
+            elif result["skipped"]:
+                counts["skipped"] += 1
+            else:
+                counts["converted"] += 1
+            emit("result", **result)
+            if report is not None:
+                report.add(result)
+
+            now = time.monotonic()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                emit("progress", elapsed=round(now - start, 3), **counts)
+    except KeyboardInterrupt:
+        converter.abort()
+
+    elapsed = time.monotonic() - start
+    done = sum(counts.values())
+    emit("summary",
+         elapsed=round(elapsed, 3),
+         images_per_sec=round(done / elapsed, 2) if elapsed else 0,
+         aborted=converter.aborted,
+         **counts)
+
+    if report is not None:
+        report.finish()
+        report.export(args.report)
+        emit("report", path=args.report, **report.summary())
+    return 1 if counts["failed"] or converter.aborted else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+import os
+import queue
+import logging
+import threading
+from functools import partial
+
+from PIL import Image
+
+from package.cache import ConversionCache, mark_output_folder
+from package.encoders import DEFAULT_ENCODER
+from package.image import CustomImage, sort_outputs
+from package.pipeline import DONE, MemoryBudget, Stage
+from package.stats import STAGES
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+DEFAULT_MEMORY_BUDGET = 1024 * 1024 * 1024
+PRESETS = {
+    "web": [{"size": 1.0, "quality": 85, "folder": "web_100"},
+            {"size": 0.5, "quality": 80, "folder": "web_50"},
+            {"size": 0.25, "quality": 75, "folder": "web_25"}],
+}
+
+
+class Converter:
+    def __init__(self, size=0.5, quality=75, folder="reduced", mode="exact", workers=DEFAULT_WORKERS,
+                 use_cache=True, resample=Image.LANCZOS, max_bytes=None, outputs=None, instrument=False,
+                 memory_budget=DEFAULT_MEMORY_BUDGET, encoder=DEFAULT_ENCODER, encoder_options=None):
+        # Every output is a dict with size, quality, folder, max_bytes, encoder
+        # and options keys; several outputs are produced from a single decode
+        # of the source.
+        outputs = outputs or [{"size": size, "quality": quality, "folder": folder}]
+        defaults = {"max_bytes": max_bytes, "encoder": encoder, "options": encoder_options or {}}
+        self.outputs = [dict(defaults, **output) for output in outputs]
+        self.mode = mode
+        self.resample = resample
+        self.workers = max(1, workers)
+        self.instrument = instrument
+        self.cache = ConversionCache() if use_cache else None
+        self.budget = MemoryBudget(memory_budget)
+        self._abort_event = threading.Event()
+        self._marked_folders = set()
+
+    @property
+    def aborted(self):
+        return self._abort_event.is_set()
+
+    @property
+    def params(self):
+        return {"outputs": self.outputs, "mode": self.mode, "resample": int(self.resample)}
+
+    def abort(self):
+        self._abort_event.set()
+
+    def convert(self, paths):
+        # Decoding, resizing and encoding run as separate stages connected by
+        # bounded queues. Pillow releases the GIL in all three, so the stages
+        # keep every core busy. A job is only admitted once the memory it
+        # needs, estimated from the header, fits in the budget: small images
+        # flow freely while huge ones wait for room instead of piling up.
+        decode_queue = queue.Queue(maxsize=self.workers)
+        resize_queue = queue.Queue(maxsize=self.workers)
+        save_queue = queue.Queue(maxsize=self.workers)
+        results = queue.Queue()
+        stages = [Stage("decode", partial(self._run_step, step=self._decode), decode_queue, resize_queue,
+                        self.workers),
+                  Stage("resize", partial(self._run_step, step=self._resize), resize_queue, save_queue,
+                        self.workers),
+                  Stage("save", self._finish, save_queue, results, self.workers)]
+        feeder = threading.Thread(target=self._feed, args=(paths, decode_queue, results), daemon=True)
+        for stage in stages:
+            stage.start()
+        feeder.start()
+
+        try:
+            while True:
+                result = results.get()
+                if result is DONE:
+                    break
+                yield result
+        except GeneratorExit:
+            self.abort()
+            raise
+        finally:
+            feeder.join()
+            for stage in stages:
+                stage.join()
+
+    def _feed(self, paths, decode_queue, results):
+        try:
+            for path in paths:
+                if self.aborted:
+                    break
+                job = self._admit(path)
+                if job["admitted"]:
+                    decode_queue.put(job)
+                else:
+                    results.put(job["result"])
+        finally:
+            decode_queue.put(DONE)
+
+    def _admit(self, path):
+        result = {"path": path, "success": False, "skipped": False}
+        job = {"result": result, "admitted": False, "failed": False, "cost": 0, "timings": None}
+        if self.instrument:
+            job["timings"] = result["timings"] = {}
+
+        try:
+            # The manifest of the cache lives in the folder of the first output
+            image = job["image"] = CustomImage(path=path, folder=self.outputs[0]["folder"])
+            if self.cache is not None:
+                job["signature"] = self.cache.signature(path)
+                output_paths = [image.output_path(output["folder"], output["encoder"]) for output in self.outputs]
+                if self.cache.is_up_to_date(image, self.params, signature=job["signature"],
+                                            output_paths=output_paths):
+                    result["success"] = result["skipped"] = True
+                    return job
+            cost = image.estimated_bytes(self.outputs)
+        except Exception as e:
+            logging.error(f"Impossible de convertir l'image {path} : {e}")
+            return job
+
+        if self.budget.acquire(cost, abort_event=self._abort_event):
+            job["cost"] = cost
+            job["admitted"] = True
+        return job
+
+    def _run_step(self, job, step):
+        if not job["failed"] and not self.aborted:
+            try:
+                step(job)
+            except Exception as e:
+                job["failed"] = True
+                logging.error(f"Impossible de convertir l'image {job['result']['path']} : {e}")
+        return job
+
+    def _decode(self, job):
+        new_size = job["image"].scaled_size(sort_outputs(self.outputs)[0]["size"])
+        job["source"] = job["image"].decode_image(new_size, mode=self.mode, timings=job["timings"])
+
+    def _resize(self, job):
+        job["resized"] = job["image"].resize_image(job.pop("source"),
+                                                   self.outputs,
+                                                   mode=self.mode,
+                                                   resample=self.resample,
+                                                   timings=job["timings"])
+
+    def _save(self, job):
+        success = job["image"].save_images(job.pop("resized"),
+                                           abort_event=self._abort_event,
+                                           timings=job["timings"])
+        job["result"]["success"] = success
+        if success and self.cache is not None:
+            self.cache.add(job["image"], self.params, signature=job["signature"])
+        if success:
+            for output in self.outputs:
+                folder = os.path.dirname(job["image"].output_path(output["folder"], output["encoder"]))
+                if folder not in self._marked_folders:
+                    mark_output_folder(folder)
+                    self._marked_folders.add(folder)
+
+    def _finish(self, job):
+        self._run_step(job, step=self._save)
+
+        # Images left behind by a failed or aborted job
+        if "source" in job:
+            job["source"].close()
+        for output, image in job.get("resized", []):
+            image.close()
+        self.budget.release(job["cost"])
+
+        timings = job["timings"]
+        if timings is not None:
+            timings["total"] = sum(timings.get(stage, 0.0) for stage in STAGES)
+        return job["result"]
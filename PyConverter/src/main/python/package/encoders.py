@@ -0,0 +1,38 @@
+import os
+from io import BytesIO
+
+from PIL import features
+
+DEFAULT_ENCODER = "jpeg"
+ENCODERS = {
+    "jpeg": {"format": "JPEG", "extensions": (".jpg", ".jpeg"), "modes": ("RGB", "L", "CMYK"),
+             "options": {}},
+    "jpeg_progressive": {"format": "JPEG", "extensions": (".jpg", ".jpeg"), "modes": ("RGB", "L", "CMYK"),
+                         "options": {"optimize": True, "progressive": True, "subsampling": 2}},
+    "webp": {"format": "WEBP", "extensions": (".webp",), "modes": ("RGB", "RGBA"),
+             "options": {"method": 4}},
+}
+ENCODER_LABELS = {"jpeg": "JPEG", "jpeg_progressive": "JPEG progressif optimisé", "webp": "WebP"}
+
+
+def available_encoders():
+    return [name for name, encoder in ENCODERS.items()
+            if encoder["format"] != "WEBP" or features.check("webp")]
+
+
+def output_name(path, encoder=DEFAULT_ENCODER):
+    # The extension of the format is appended to the whole source name, so
+    # that a.png and a.jpg don't both become a.jpg
+    name = os.path.basename(path)
+    extensions = ENCODERS[encoder]["extensions"]
+    return name if os.path.splitext(name)[1].lower() in extensions else name + extensions[0]
+
+
+def encode(image, encoder=DEFAULT_ENCODER, quality=75, options=None):
+    settings = ENCODERS[encoder]
+    if image.mode not in settings["modes"]:
+        image = image.convert("RGBA" if "RGBA" in settings["modes"] and "A" in image.getbands() else "RGB")
+
+    buffer = BytesIO()
+    image.save(buffer, settings["format"], quality=quality, **dict(settings["options"], **(options or {})))
+    return buffer
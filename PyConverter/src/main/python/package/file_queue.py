@@ -0,0 +1,133 @@
+import time
+from array import array
+
+from PySide2 import QtCore
+
+from package.walker import iter_images
+
+PENDING, CONVERTED, FAILED = 0, 1, 2
+SCAN_BATCH_SIZE = 500
+SCAN_BATCH_INTERVAL = 0.1
+
+
+class FileQueueModel(QtCore.QAbstractListModel):
+    def __init__(self, ctx, thumbnails=None, parent=None):
+        super().__init__(parent)
+        self.ctx = ctx
+        self.thumbnails = thumbnails
+        if thumbnails is not None:
+            thumbnails.thumbnail_ready.connect(self.thumbnail_ready)
+        self._paths = []
+        self._rows = {}
+        self._states = array("b")
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._paths)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = index.row()
+        if role == QtCore.Qt.DisplayRole:
+            return self._paths[row]
+        if role == QtCore.Qt.DecorationRole:
+            converted = self._states[row] == CONVERTED
+            icon = self.ctx.img_checked if converted else self.ctx.img_unchecked
+            if self.thumbnails is None:
+                return icon
+            pixmap = self.thumbnails.get_badged(self._paths[row], converted, icon)
+            return icon if pixmap is None else pixmap
+        if role == QtCore.Qt.ToolTipRole and self._states[row] == FAILED:
+            return "La conversion de cette image a échoué."
+        return None
+
+    def add_paths(self, paths):
+        new_paths = []
+        seen = set()
+        for path in paths:
+            if path not in self._rows and path not in seen:
+                seen.add(path)
+                new_paths.append(path)
+        if not new_paths:
+            return 0
+
+        first_row = len(self._paths)
+        self.beginInsertRows(QtCore.QModelIndex(), first_row, first_row + len(new_paths) - 1)
+        for row, path in enumerate(new_paths, start=first_row):
+            self._rows[path] = row
+        self._paths.extend(new_paths)
+        self._states.extend([PENDING] * len(new_paths))
+        self.endInsertRows()
+        return len(new_paths)
+
+    def remove_rows(self, rows):
+        # Contiguous ranges are removed from the bottom up so that the rows
+        # still to remove keep their index; the path index is rebuilt once.
+        rows = sorted(set(rows), reverse=True)
+        while rows:
+            last = first = rows.pop(0)
+            while rows and rows[0] == first - 1:
+                first = rows.pop(0)
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            del self._paths[first:last + 1]
+            del self._states[first:last + 1]
+            self.endRemoveRows()
+
+        self._rows = {path: row for row, path in enumerate(self._paths)}
+
+    def thumbnail_ready(self, path):
+        row = self._rows.get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [QtCore.Qt.DecorationRole])
+
+    def pending_paths(self):
+        return [path for path, state in zip(self._paths, self._states) if state != CONVERTED]
+
+    def set_state(self, path, state):
+        self.set_states([(path, state)])
+
+    def set_states(self, states):
+        # A whole batch of updates triggers a single dataChanged
+        rows = []
+        for path, state in states:
+            row = self._rows.get(path)
+            if row is not None:
+                self._states[row] = state
+                rows.append(row)
+        if not rows:
+            return
+
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)),
+                              [QtCore.Qt.DecorationRole, QtCore.Qt.ToolTipRole])
+
+
+class FolderScanner(QtCore.QObject):
+    files_found = QtCore.Signal(list)
+    finished = QtCore.Signal()
+
+    def __init__(self, paths, exclude=()):
+        super().__init__()
+        self.paths = paths
+        self.exclude = exclude
+        self.runs = True
+
+    def scan(self):
+        # Paths are sent in batches so the model inserts thousands of rows at once
+        batch = []
+        last_emit = time.monotonic()
+        for path in iter_images(self.paths, exclude=self.exclude):
+            if not self.runs:
+                break
+            batch.append(path)
+            if len(batch) >= SCAN_BATCH_SIZE or time.monotonic() - last_emit >= SCAN_BATCH_INTERVAL:
+                self.files_found.emit(batch)
+                batch = []
+                last_emit = time.monotonic()
+
+        if batch:
+            self.files_found.emit(batch)
+        self.finished.emit()
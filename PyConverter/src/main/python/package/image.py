@@ -1,28 +1,209 @@
 import os
+import time
+import logging
 
 from PIL import Image
 
+from package.encoders import DEFAULT_ENCODER, available_encoders, encode, output_name
+from package.stats import measure
+
+QUALITY_MODES = ("exact", "fast")
+
+
+def sort_outputs(outputs):
+    return sorted(outputs, key=lambda output: output["size"], reverse=True)
+
 
 class CustomImage:
     def __init__(self, path, folder="reduced"):
-        self.image = Image.open(path)
-        self.width, self.height = self.image.size
         self.path = path
-        self.reduced_path = os.path.join(os.path.dirname(self.path),
-                                         folder,
-                                         os.path.basename(self.path))
+        self.folder = folder
+        self.reduced_path = self.output_path(folder)
+        self._header = None
+
+    @property
+    def header(self):
+        # Image.open only parses the header; the file is closed right after
+        if self._header is None:
+            with Image.open(self.path) as image:
+                self._header = (image.size, image.mode)
+        return self._header
+
+    @property
+    def size(self):
+        return self.header[0]
+
+    @property
+    def width(self):
+        return self.size[0]
+
+    @property
+    def height(self):
+        return self.size[1]
+
+    def output_path(self, folder, encoder=DEFAULT_ENCODER):
+        return os.path.join(os.path.dirname(self.path), folder, output_name(self.path, encoder))
+
+    def scaled_size(self, size):
+        return max(1, round(self.width * size)), max(1, round(self.height * size))
+
+    def estimated_bytes(self, outputs):
+        # Decoded source plus every resized output, estimated from the header
+        bands = Image.getmodebands(self.header[1])
+        pixels = self.width * self.height
+        for output in outputs:
+            width, height = self.scaled_size(output["size"])
+            pixels += width * height
+        return pixels * bands
+
+    def reduce_image(self, size=0.5, quality=75, mode="exact", resample=Image.LANCZOS, max_bytes=None,
+                     abort_event=None):
+        output = {"size": size, "quality": quality, "folder": self.folder, "max_bytes": max_bytes}
+        return self.reduce_image_pyramid([output], mode=mode, resample=resample, abort_event=abort_event)
+
+    def reduce_image_pyramid(self, outputs, mode="exact", resample=Image.LANCZOS, abort_event=None,
+                             timings=None):
+        # When a timings dict is given, the time spent in each stage and the
+        # input/output sizes are accumulated into it.
+        outputs = sort_outputs(outputs)
+        source = self.decode_image(self.scaled_size(outputs[0]["size"]), mode=mode, timings=timings)
+        resized_images = self.resize_image(source, outputs, mode=mode, resample=resample, timings=timings)
+        return self.save_images(resized_images, abort_event=abort_event, timings=timings)
+
+    def decode_image(self, new_size, mode="exact", timings=None):
+        # Loading a single-frame image closes its file, so the returned image
+        # only holds pixels
+        with measure(timings, "open"):
+            source = Image.open(self.path)
+
+        try:
+            with measure(timings, "decode"):
+                if mode == "fast":
+                    source.draft(source.mode, new_size)
+                source.load()
+        except Exception:
+            source.close()
+            raise
+        if timings is not None:
+            timings["input_bytes"] = os.path.getsize(self.path)
+        return source
+
+    def resize_image(self, source, outputs, mode="exact", resample=Image.LANCZOS, timings=None):
+        # The source is resized for the largest output, then every smaller
+        # output is resized from the previous one instead of from the source.
+        # Returns (output, image) pairs and closes the source.
+        resized_images = []
+        image = source
+        with source, measure(timings, "resize"):
+            for output in sort_outputs(outputs):
+                new_size = self.scaled_size(output["size"])
+                if image is source and mode == "fast":
+                    image = self.draft_image(source, *new_size)
+                if image.size != new_size or image is source:
+                    image = image.resize(new_size, resample)
+                resized_images.append((output, image))
+        return resized_images
+
+    def save_images(self, resized_images, abort_event=None, timings=None):
+        success = True
+        try:
+            for output, image in resized_images:
+                if abort_event is not None and abort_event.is_set():
+                    return False
+                with measure(timings, "encode"):
+                    buffer = self.encode_image(image,
+                                               quality=output.get("quality", 75),
+                                               max_bytes=output.get("max_bytes"),
+                                               encoder=output.get("encoder", DEFAULT_ENCODER),
+                                               options=output.get("options"))
+                if abort_event is not None and abort_event.is_set():
+                    return False
+                with measure(timings, "write"):
+                    output_path = self.output_path(output["folder"], output.get("encoder", DEFAULT_ENCODER))
+                    success = self.write_buffer(buffer, output_path) and success
+                if timings is not None:
+                    timings["output_bytes"] = timings.get("output_bytes", 0) + buffer.getbuffer().nbytes
+        finally:
+            for output, image in resized_images:
+                image.close()
+
+        return success
+
+    @staticmethod
+    def write_buffer(buffer, path):
+        # Several workers may create the same output folder at once
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(buffer.getbuffer())
+        return os.path.exists(path)
+
+    def encode_image(self, image, quality=75, max_bytes=None, encoder=DEFAULT_ENCODER, options=None):
+        buffer = encode(image, encoder=encoder, quality=quality, options=options)
+        if max_bytes is None or buffer.getbuffer().nbytes <= max_bytes:
+            return buffer
+
+        # Binary search of the highest quality under the budget. Every attempt
+        # encodes the same resized image in memory, nothing is decoded again.
+        best, smallest = None, buffer
+        low, high = 1, quality - 1
+        while low <= high:
+            middle = (low + high) // 2
+            candidate = encode(image, encoder=encoder, quality=middle, options=options)
+            if candidate.getbuffer().nbytes <= max_bytes:
+                best = candidate
+                low = middle + 1
+            else:
+                smallest = candidate
+                high = middle - 1
+
+        if best is None:
+            logging.warning(f"{self.path} dépasse {max_bytes} octets même à la qualité minimale.")
+            return smallest
+        return best
+
+    @staticmethod
+    def draft_image(image, width, height):
+        # JPEG sources are decoded directly at 1/2, 1/4 or 1/8 scale (DCT scaling),
+        # then Image.reduce box-filters by the remaining integer factor so that
+        # the final resize only handles a ratio between 1 and 2. Once the image
+        # is loaded, draft() does nothing and only the reduce step remains.
+        image.draft(image.mode, (width, height))
+        factor = min(image.width // width, image.height // height)
+        if factor > 1:
+            return image.reduce(factor)
+        return image
+
 
-    def reduce_image(self, size=0.5, quality=75):
-        new_width = round(self.width * size)
-        new_height = round(self.height * size)
-        self.image = self.image.resize((new_width, new_height), Image.ANTIALIAS)
-        parent_dir = os.path.dirname(self.reduced_path)
+def compare_encoders(paths, encoders=None, size=0.5, quality=75, mode="exact", options=None):
+    # Every image is decoded and resized once, then encoded with each format,
+    # so only the encoders are compared, on the same pixels
+    encoders = encoders or available_encoders()
+    totals = {name: {"encoder": name, "images": 0, "bytes": 0, "seconds": 0.0} for name in encoders}
+    input_bytes = 0
+    for path in paths:
+        image = CustomImage(path)
+        try:
+            source = image.decode_image(image.scaled_size(size), mode=mode)
+            resized_image = image.resize_image(source, [{"size": size}], mode=mode)[0][1]
+        except Exception as e:
+            logging.error(f"Impossible de lire l'image {path} : {e}")
+            continue
 
-        if not os.path.exists(parent_dir):
-            os.makedirs(parent_dir)
+        with resized_image:
+            input_bytes += os.path.getsize(path)
+            for name in encoders:
+                start = time.perf_counter()
+                buffer = encode(resized_image, encoder=name, quality=quality, options=options)
+                totals[name]["seconds"] += time.perf_counter() - start
+                totals[name]["bytes"] += buffer.getbuffer().nbytes
+                totals[name]["images"] += 1
 
-        self.image.save(self.reduced_path, 'JPEG', quality=quality)
-        return os.path.exists(self.reduced_path)
+    reference = totals[encoders[0]]["bytes"]
+    for total in totals.values():
+        total["seconds"] = round(total["seconds"], 4)
+        total["ms_per_image"] = round(total["seconds"] * 1000 / total["images"], 2) if total["images"] else 0
+        total["size_ratio"] = round(total["bytes"] / reference, 3) if reference else 0
+    return {"input_bytes": input_bytes, "reference": encoders[0], "results": list(totals.values())}
 
 
 if __name__ == '__main__':
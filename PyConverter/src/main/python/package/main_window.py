@@ -1,35 +1,59 @@
+import os
+import time
+from collections import deque
+
 from PySide2 import QtWidgets, QtCore, QtGui
 
-from package.image import CustomImage
+from package.converter import Converter, DEFAULT_MEMORY_BUDGET, DEFAULT_WORKERS, PRESETS
+from package.encoders import DEFAULT_ENCODER, ENCODER_LABELS, available_encoders
+from package.file_queue import FileQueueModel, FolderScanner, CONVERTED, FAILED
+from package.image import QUALITY_MODES
+from package.thumbnails import ThumbnailProvider, THUMBNAIL_SIZE
+
+MODE_LABELS = {"exact": "Exacte", "fast": "Rapide"}
+PRESET_LABELS = {"web": "Web (100, 50 et 25 %)"}
+PROGRESS_INTERVAL = 50
 
 
 class Worker(QtCore.QObject):
-    image_converted = QtCore.Signal(object, bool)
     finished = QtCore.Signal()
 
-    def __init__(self, images_to_convert, quality, size, folder):
+    def __init__(self, images_to_convert, quality, size, folder, mode="exact", workers=DEFAULT_WORKERS,
+                 max_bytes=None, outputs=None, memory_budget=DEFAULT_MEMORY_BUDGET, encoder=DEFAULT_ENCODER):
         super().__init__()
         self.images_to_convert = images_to_convert
-        self.quality = quality
-        self.size = size
-        self.folder = folder
-        self.runs = True
+        self.results = deque()
+        self.converter = Converter(size=size, quality=quality, folder=folder, mode=mode, workers=workers,
+                                   max_bytes=max_bytes, outputs=outputs, memory_budget=memory_budget,
+                                   encoder=encoder)
 
     def convert_images(self):
-        for image_lw_item in self.images_to_convert:
-            if self.runs and not image_lw_item.processed:
-                image = CustomImage(path=image_lw_item.text(), folder=self.folder)
-                success = image.reduce_image(size=self.size, quality=self.quality)
-                self.image_converted.emit(image_lw_item, success)
+        # Results are not sent one signal at a time: the window collects them
+        # in batches with take_results() so fast conversions can't flood the
+        # event loop.
+        for result in self.converter.convert(self.images_to_convert):
+            self.results.append((result["path"], result["success"]))
 
         self.finished.emit()
 
+    def take_results(self):
+        results = []
+        while self.results:
+            results.append(self.results.popleft())
+        return results
+
+    def abort(self):
+        self.converter.abort()
+
 
 class MainWindow(QtWidgets.QWidget):
     def __init__(self, ctx):
         super().__init__()
         self.ctx = ctx
         self.setWindowTitle("PyConverter")
+        self.scanners = []
+        self.progress_timer = QtCore.QTimer(self)
+        self.progress_timer.setInterval(PROGRESS_INTERVAL)
         self.setup_ui()
 
     def setup_ui(self):
@@ -40,13 +64,27 @@ class MainWindow(QtWidgets.QWidget):
         self.setup_connections()
 
     def create_widgets(self):
+        self.lbl_preset = QtWidgets.QLabel("Préréglage:")
+        self.cmb_preset = QtWidgets.QComboBox()
         self.lbl_quality = QtWidgets.QLabel("Qualité:")
         self.spn_quality = QtWidgets.QSpinBox()
         self.lbl_size = QtWidgets.QLabel("Taille:")
         self.spn_size = QtWidgets.QSpinBox()
+        self.lbl_maxSize = QtWidgets.QLabel("Poids max (Ko):")
+        self.spn_maxSize = QtWidgets.QSpinBox()
         self.lbl_dossierOut = QtWidgets.QLabel("Dossier de sortie:")
         self.le_dossierOut = QtWidgets.QLineEdit()
-        self.lw_files = QtWidgets.QListWidget()
+        self.lbl_format = QtWidgets.QLabel("Format:")
+        self.cmb_format = QtWidgets.QComboBox()
+        self.lbl_mode = QtWidgets.QLabel("Mode:")
+        self.cmb_mode = QtWidgets.QComboBox()
+        self.lbl_workers = QtWidgets.QLabel("Threads:")
+        self.spn_workers = QtWidgets.QSpinBox()
+        self.lbl_memory = QtWidgets.QLabel("Mémoire max (Mo):")
+        self.spn_memory = QtWidgets.QSpinBox()
+        self.lv_files = QtWidgets.QListView()
+        self.thumbnails = ThumbnailProvider(parent=self)
+        self.model = FileQueueModel(ctx=self.ctx, thumbnails=self.thumbnails, parent=self)
         self.btn_convert = QtWidgets.QPushButton("Conversion")
         self.lbl_dropInfo = QtWidgets.QLabel("^ Déposez les images sur l'interface")
 
@@ -58,13 +96,41 @@ class MainWindow(QtWidgets.QWidget):
         # Alignment
         self.spn_quality.setAlignment(QtCore.Qt.AlignRight)
         self.spn_size.setAlignment(QtCore.Qt.AlignRight)
+        self.spn_maxSize.setAlignment(QtCore.Qt.AlignRight)
         self.le_dossierOut.setAlignment(QtCore.Qt.AlignRight)
+        self.spn_workers.setAlignment(QtCore.Qt.AlignRight)
+        self.spn_memory.setAlignment(QtCore.Qt.AlignRight)
 
         # Range
         self.spn_quality.setRange(1, 100)
         self.spn_quality.setValue(75)
         self.spn_size.setRange(1, 100)
         self.spn_size.setValue(50)
+        self.spn_maxSize.setRange(0, 100000)
+        self.spn_maxSize.setSingleStep(50)
+        self.spn_maxSize.setSpecialValueText("Aucun")
+        self.spn_maxSize.setToolTip("La qualité est réduite jusqu'à ce que chaque image respecte ce poids.")
+        self.spn_workers.setRange(1, max(DEFAULT_WORKERS, 32))
+        self.spn_workers.setValue(DEFAULT_WORKERS)
+        self.spn_memory.setRange(64, 65536)
+        self.spn_memory.setSingleStep(256)
+        self.spn_memory.setValue(DEFAULT_MEMORY_BUDGET // 2 ** 20)
+        self.spn_memory.setToolTip("Les grandes images attendent qu'il y ait assez de mémoire pour être converties.")
+
+        # Presets
+        self.cmb_preset.addItem("Aucun", None)
+        for preset, label in PRESET_LABELS.items():
+            self.cmb_preset.addItem(label, preset)
+
+        # Format
+        for encoder in available_encoders():
+            self.cmb_format.addItem(ENCODER_LABELS[encoder], encoder)
+        self.cmb_format.setToolTip("Le WebP est plus léger que le JPEG à qualité égale.")
+
+        # Mode
+        for mode in QUALITY_MODES:
+            self.cmb_mode.addItem(MODE_LABELS[mode], mode)
+        self.cmb_mode.setToolTip("Le mode rapide décode les JPEG directement à une taille réduite.")
 
         # Divers
         self.le_dossierOut.setPlaceholderText("Dossier de sortie...")
@@ -72,34 +138,67 @@ class MainWindow(QtWidgets.QWidget):
         self.lbl_dropInfo.setVisible(False)
 
         self.setAcceptDrops(True)
-        self.lw_files.setAlternatingRowColors(True)
-        self.lw_files.setSelectionMode(QtWidgets.QListWidget.ExtendedSelection)
+        self.lv_files.setModel(self.model)
+        self.lv_files.setUniformItemSizes(True)
+        self.lv_files.setIconSize(QtCore.QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.lv_files.setAlternatingRowColors(True)
+        self.lv_files.setSelectionMode(QtWidgets.QListView.ExtendedSelection)
 
     def create_layouts(self):
         self.main_layout = QtWidgets.QGridLayout(self)
 
     def add_widgets_to_layouts(self):
-        self.main_layout.addWidget(self.lbl_quality, 0, 0, 1, 1)
-        self.main_layout.addWidget(self.spn_quality, 0, 1, 1, 1)
-        self.main_layout.addWidget(self.lbl_size, 1, 0, 1, 1)
-        self.main_layout.addWidget(self.spn_size, 1, 1, 1, 1)
-        self.main_layout.addWidget(self.lbl_dossierOut, 2, 0, 1, 1)
-        self.main_layout.addWidget(self.le_dossierOut, 2, 1, 1, 1)
-        self.main_layout.addWidget(self.lw_files, 3, 0, 1, 2)
-        self.main_layout.addWidget(self.lbl_dropInfo, 4, 0, 1, 2)
-        self.main_layout.addWidget(self.btn_convert, 5, 0, 1, 2)
+        self.main_layout.addWidget(self.lbl_preset, 0, 0, 1, 1)
+        self.main_layout.addWidget(self.cmb_preset, 0, 1, 1, 1)
+        self.main_layout.addWidget(self.lbl_quality, 1, 0, 1, 1)
+        self.main_layout.addWidget(self.spn_quality, 1, 1, 1, 1)
+        self.main_layout.addWidget(self.lbl_size, 2, 0, 1, 1)
+        self.main_layout.addWidget(self.spn_size, 2, 1, 1, 1)
+        self.main_layout.addWidget(self.lbl_maxSize, 3, 0, 1, 1)
+        self.main_layout.addWidget(self.spn_maxSize, 3, 1, 1, 1)
+        self.main_layout.addWidget(self.lbl_dossierOut, 4, 0, 1, 1)
+        self.main_layout.addWidget(self.le_dossierOut, 4, 1, 1, 1)
+        self.main_layout.addWidget(self.lbl_format, 5, 0, 1, 1)
+        self.main_layout.addWidget(self.cmb_format, 5, 1, 1, 1)
+        self.main_layout.addWidget(self.lbl_mode, 6, 0, 1, 1)
+        self.main_layout.addWidget(self.cmb_mode, 6, 1, 1, 1)
+        self.main_layout.addWidget(self.lbl_workers, 7, 0, 1, 1)
+        self.main_layout.addWidget(self.spn_workers, 7, 1, 1, 1)
+        self.main_layout.addWidget(self.lbl_memory, 8, 0, 1, 1)
+        self.main_layout.addWidget(self.spn_memory, 8, 1, 1, 1)
+        self.main_layout.addWidget(self.lv_files, 9, 0, 1, 2)
+        self.main_layout.addWidget(self.lbl_dropInfo, 10, 0, 1, 2)
+        self.main_layout.addWidget(self.btn_convert, 11, 0, 1, 2)
 
     def setup_connections(self):
-        QtWidgets.QShortcut(QtGui.QKeySequence("Backspace"), self.lw_files, self.delete_selected_items)
+        QtWidgets.QShortcut(QtGui.QKeySequence("Backspace"), self.lv_files, self.delete_selected_items)
         self.btn_convert.clicked.connect(self.convert_images)
+        self.cmb_preset.currentIndexChanged.connect(self.preset_changed)
+        self.progress_timer.timeout.connect(self.update_progress)
+        self.lv_files.verticalScrollBar().valueChanged.connect(self.thumbnails.clear_pending)
+
+    def preset_changed(self):
+        # A preset defines its own sizes, qualities and folders
+        custom = self.cmb_preset.currentData() is None
+        for widget in (self.spn_quality, self.spn_size, self.le_dossierOut):
+            widget.setEnabled(custom)
+
+    def output_folders(self):
+        outputs = PRESETS.get(self.cmb_preset.currentData()) or [{"folder": self.le_dossierOut.text()}]
+        return {output["folder"] for output in outputs}
 
     def convert_images(self):
         quality = self.spn_quality.value()
         size = self.spn_size.value() / 100.0
+        max_bytes = self.spn_maxSize.value() * 1024 or None
         folder = self.le_dossierOut.text()
+        encoder = self.cmb_format.currentData()
+        mode = self.cmb_mode.currentData()
+        workers = self.spn_workers.value()
+        memory_budget = self.spn_memory.value() * 2 ** 20
+        outputs = PRESETS.get(self.cmb_preset.currentData())
 
-        lw_items = [self.lw_files.item(index) for index in range(self.lw_files.count())]
-        images_a_convertir = [1 for lw_item in lw_items if not lw_item.processed]
+        images_a_convertir = self.model.pending_paths()
         if not images_a_convertir:
             msg_box = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Warning,
                                             "Aucune image à convertir",
@@ -109,35 +208,73 @@ class MainWindow(QtWidgets.QWidget):
 
         self.thread = QtCore.QThread(self)
 
-        self.worker = Worker(images_to_convert=lw_items,
+        self.worker = Worker(images_to_convert=images_a_convertir,
                              quality=quality,
                              size=size,
-                             folder=folder)
+                             folder=folder,
+                             mode=mode,
+                             workers=workers,
+                             max_bytes=max_bytes,
+                             outputs=outputs,
+                             memory_budget=memory_budget,
+                             encoder=encoder)
 
         self.worker.moveToThread(self.thread)
-        self.worker.image_converted.connect(self.image_converted)
         self.thread.started.connect(self.worker.convert_images)
         self.worker.finished.connect(self.thread.quit)
-        self.thread.start()
+        self.worker.finished.connect(self.conversion_finished)
 
-        self.prg_dialog = QtWidgets.QProgressDialog("Conversion des images", "Annuler...", 1, len(images_a_convertir))
+        self.prg_dialog = QtWidgets.QProgressDialog("Conversion des images", "Annuler...", 0, len(images_a_convertir))
         self.prg_dialog.canceled.connect(self.abort)
         self.prg_dialog.show()
 
+        self.converted_count = 0
+        self.conversion_start = time.monotonic()
+        self.thread.start()
+        self.progress_timer.start()
+
     def abort(self):
-        self.worker.runs = False
+        self.worker.abort()
         self.thread.quit()
 
-    def image_converted(self, lw_item, success):
-        if success:
-            lw_item.setIcon(self.ctx.img_checked)
-            lw_item.processed = True
-            self.prg_dialog.setValue(self.prg_dialog.value() + 1)
+    def update_progress(self):
+        results = self.worker.take_results()
+        if not results:
+            return
+
+        self.model.set_states([(path, CONVERTED if success else FAILED) for path, success in results])
+        self.converted_count += len(results)
+        if self.prg_dialog.wasCanceled():
+            return
+
+        elapsed = time.monotonic() - self.conversion_start
+        rate = self.converted_count / elapsed if elapsed else 0
+        remaining = (self.prg_dialog.maximum() - self.converted_count) / rate if rate else 0
+        minutes, seconds = divmod(round(remaining), 60)
+        self.prg_dialog.setLabelText(f"Conversion des images\n"
+                                     f"{rate:.1f} images/s - temps restant : {minutes} min {seconds:02d} s")
+        self.prg_dialog.setValue(self.converted_count)
+
+    def conversion_finished(self):
+        self.progress_timer.stop()
+        self.update_progress()
 
     def delete_selected_items(self):
-        for lw_item in self.lw_files.selectedItems():
-            row = self.lw_files.row(lw_item)
-            self.lw_files.takeItem(row)
+        rows = [index.row() for index in self.lv_files.selectionModel().selectedRows()]
+        self.model.remove_rows(rows)
+
+    def closeEvent(self, event):
+        self.thumbnails.stop()
+        for thread, scanner in self.scanners:
+            scanner.runs = False
+            thread.quit()
+            thread.wait()
+
+        if hasattr(self, "worker"):
+            self.worker.abort()
+            self.thread.quit()
+            self.thread.wait()
+        super().closeEvent(event)
 
     def dragEnterEvent(self, event):
         self.lbl_dropInfo.setVisible(True)
@@ -148,15 +285,23 @@ class MainWindow(QtWidgets.QWidget):
 
     def dropEvent(self, event):
         event.accept()
-        for url in event.mimeData().urls():
-            self.add_file(path=url.toLocalFile())
+        paths = [url.toLocalFile() for url in event.mimeData().urls()]
+        folders = [path for path in paths if os.path.isdir(path)]
+        self.model.add_paths(path for path in paths if path not in folders)
+        if folders:
+            self.scan_folders(folders)
 
         self.lbl_dropInfo.setVisible(False)
 
-    def add_file(self, path):
-        items = [self.lw_files.item(index).text() for index in range(self.lw_files.count())]
-        if path not in items:
-            lw_item = QtWidgets.QListWidgetItem(path)
-            lw_item.setIcon(self.ctx.img_unchecked)
-            lw_item.processed = False
-            self.lw_files.addItem(lw_item)
+    def scan_folders(self, folders):
+        # Folders are walked on a background thread and their images are
+        # added to the model in batches
+        thread = QtCore.QThread(self)
+        scanner = FolderScanner(paths=folders, exclude=self.output_folders())
+        scanner.moveToThread(thread)
+        scanner.files_found.connect(self.model.add_paths)
+        thread.started.connect(scanner.scan)
+        scanner.finished.connect(thread.quit)
+        thread.finished.connect(lambda: self.scanners.remove((thread, scanner)))
+        self.scanners.append((thread, scanner))
+        thread.start()
@@ -0,0 +1,62 @@
+import threading
+
+DONE = object()
+
+
+class MemoryBudget:
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, amount, abort_event=None):
+        # A job larger than the whole budget is still admitted, but alone
+        with self._condition:
+            while self.used and self.used + amount > self.limit:
+                if abort_event is not None and abort_event.is_set():
+                    return False
+                self._condition.wait(timeout=0.1)
+            self.used += amount
+            return True
+
+    def release(self, amount):
+        with self._condition:
+            self.used -= amount
+            self._condition.notify_all()
+
+
+class Stage:
+    # A group of threads that apply `function` to every item of the input
+    # queue and put the return value in the output queue. DONE is passed from
+    # worker to worker, and only the last worker to stop forwards it.
+    def __init__(self, name, function, input_queue, output_queue, workers):
+        self.function = function
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self._running = workers
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{index}", daemon=True)
+                         for index in range(workers)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self.input_queue.get()
+            if item is DONE:
+                break
+            self.output_queue.put(self.function(item))
+
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last:
+            self.output_queue.put(DONE)
+        else:
+            self.input_queue.put(DONE)
@@ -0,0 +1,83 @@
+import os
+import csv
+import json
+import time
+from contextlib import contextmanager
+
+STAGES = ("open", "decode", "resize", "encode", "write")
+PERCENTILES = (50, 90, 99)
+
+
+@contextmanager
+def measure(timings, stage):
+    # Without a timings dict this is a plain no-op context manager
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = max(0, round(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class RunReport:
+    def __init__(self):
+        self.records = []
+        self.start = time.monotonic()
+        self.end = None
+
+    def add(self, result):
+        # Skipped and failed images have no meaningful stage timings
+        if result["success"] and not result["skipped"] and result.get("timings"):
+            self.records.append({"path": result["path"], **result["timings"]})
+
+    def finish(self):
+        self.end = time.monotonic()
+
+    def summary(self):
+        elapsed = (self.end or time.monotonic()) - self.start
+        input_bytes = sum(record.get("input_bytes", 0) for record in self.records)
+        output_bytes = sum(record.get("output_bytes", 0) for record in self.records)
+        summary = {"images": len(self.records),
+                   "elapsed": round(elapsed, 3),
+                   "images_per_sec": round(len(self.records) / elapsed, 2) if elapsed else 0,
+                   "input_mb_per_sec": round(input_bytes / elapsed / 1e6, 2) if elapsed else 0,
+                   "input_bytes": input_bytes,
+                   "output_bytes": output_bytes,
+                   "compression_ratio": round(input_bytes / output_bytes, 2) if output_bytes else 0,
+                   "stages": {}}
+
+        for stage in STAGES + ("total",):
+            values = sorted(record.get(stage, 0.0) for record in self.records)
+            stage_summary = {"total": round(sum(values), 4),
+                             "mean": round(sum(values) / len(values), 4) if values else 0.0,
+                             "max": round(values[-1], 4) if values else 0.0}
+            for percent in PERCENTILES:
+                stage_summary[f"p{percent}"] = round(percentile(values, percent), 4)
+            summary["stages"][stage] = stage_summary
+        return summary
+
+    def export(self, path):
+        summary = self.summary()
+        if os.path.splitext(path)[1].lower() == ".csv":
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["metric", "value"])
+                for key, value in summary.items():
+                    if key != "stages":
+                        writer.writerow([key, value])
+                for stage, values in summary["stages"].items():
+                    for key, value in values.items():
+                        writer.writerow([f"{stage}.{key}", value])
+        else:
+            with open(path, "w") as f:
+                json.dump({"summary": summary, "images": self.records}, f, indent=4)
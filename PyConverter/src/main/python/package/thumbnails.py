@@ -0,0 +1,184 @@
+import os
+import logging
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+
+from PIL import Image
+from PySide2 import QtCore, QtGui
+
+THUMBNAILS_DIR = os.path.join(Path.home(), ".cache", "pyconverter", "thumbnails")
+THUMBNAIL_SIZE = 64
+BADGE_SIZE = 20
+DEFAULT_MEMORY = 32 * 1024 * 1024
+MAX_DISK_BYTES = 256 * 1024 * 1024
+
+
+def thumbnail_path(path, size=THUMBNAIL_SIZE):
+    stat = os.stat(path)
+    key = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{size}"
+    return os.path.join(THUMBNAILS_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg")
+
+
+def create_thumbnail(path, size=THUMBNAIL_SIZE):
+    # Returns the path of the cached thumbnail, creating it from a draft
+    # decode when it is missing or the source changed since
+    cache_path = thumbnail_path(path, size=size)
+    if os.path.exists(cache_path):
+        # The mtime records the last use, for prune_thumbnails
+        os.utime(cache_path)
+        return cache_path
+
+    with Image.open(path) as image:
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB")
+        image.thumbnail((size, size), Image.BILINEAR)
+
+    os.makedirs(THUMBNAILS_DIR, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    image.save(tmp_path, "JPEG", quality=80)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+def prune_thumbnails(max_bytes=MAX_DISK_BYTES):
+    # The least recently used thumbnails are deleted once the cache on disk
+    # grows over max_bytes
+    try:
+        with os.scandir(THUMBNAILS_DIR) as entries:
+            files = [(entry.stat().st_mtime_ns, entry.stat().st_size, entry.path)
+                     for entry in entries if entry.is_file()]
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError as e:
+            logging.debug(f"Impossible de supprimer l'aperçu {path} : {e}")
+
+
+def add_badge(pixmap, icon):
+    pixmap = QtGui.QPixmap(pixmap)
+    painter = QtGui.QPainter(pixmap)
+    icon.paint(painter, QtCore.QRect(pixmap.width() - BADGE_SIZE, pixmap.height() - BADGE_SIZE,
+                                     BADGE_SIZE, BADGE_SIZE))
+    painter.end()
+    return pixmap
+
+
+class ThumbnailSignals(QtCore.QObject):
+    loaded = QtCore.Signal(str, object)
+
+
+class ThumbnailLoader(QtCore.QRunnable):
+    def __init__(self, path, signals):
+        super().__init__()
+        self.path = path
+        self.signals = signals
+
+    def run(self):
+        # QImage can be created outside of the GUI thread, QPixmap can't
+        try:
+            image = QtGui.QImage(create_thumbnail(self.path))
+        except Exception as e:
+            logging.debug(f"Pas d'aperçu pour {self.path} : {e}")
+            image = None
+        self.signals.loaded.emit(self.path, image)
+
+
+class ThumbnailPruner(QtCore.QRunnable):
+    def __init__(self, max_bytes):
+        super().__init__()
+        self.max_bytes = max_bytes
+
+    def run(self):
+        prune_thumbnails(self.max_bytes)
+
+
+class ThumbnailProvider(QtCore.QObject):
+    thumbnail_ready = QtCore.Signal(str)
+
+    def __init__(self, max_memory=DEFAULT_MEMORY, max_disk_bytes=MAX_DISK_BYTES, parent=None):
+        super().__init__(parent)
+        self.max_memory = max_memory
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.signals = ThumbnailSignals()
+        self.signals.loaded.connect(self._loaded)
+        self._pixmaps = OrderedDict()
+        self._badges = {}
+        self._memory = 0
+        self._pending = set()
+        self._failed = set()
+        self.pool.start(ThumbnailPruner(max_disk_bytes))
+
+    def get(self, path):
+        # Only the rows being painted ask for a thumbnail, so the work follows
+        # what is visible instead of the whole queue
+        pixmap = self._pixmaps.get(path)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(path)
+            return pixmap
+
+        if path not in self._pending and path not in self._failed:
+            self._pending.add(path)
+            self.pool.start(ThumbnailLoader(path, self.signals))
+        return None
+
+    def get_badged(self, path, state, icon):
+        # The badged copy is painted once per state instead of on every
+        # repaint of the row
+        pixmap = self.get(path)
+        if pixmap is None:
+            return None
+
+        badges = self._badges.setdefault(path, {})
+        badged = badges.get(state)
+        if badged is None:
+            badged = badges[state] = add_badge(pixmap, icon)
+            self._memory += self._pixmap_bytes(badged)
+            self._shrink()
+        return badged
+
+    def clear_pending(self):
+        # Rows scrolled out of view don't need their thumbnail anymore; the
+        # visible ones will ask again when they are painted
+        self.pool.clear()
+        self._pending.clear()
+
+    def stop(self):
+        self.clear_pending()
+        self.pool.waitForDone()
+
+    def _loaded(self, path, image):
+        self._pending.discard(path)
+        if image is None or image.isNull():
+            self._failed.add(path)
+            return
+
+        pixmap = QtGui.QPixmap.fromImage(image)
+        if path in self._pixmaps:
+            self._evict(path)
+        self._pixmaps[path] = pixmap
+        self._memory += self._pixmap_bytes(pixmap)
+        self._shrink()
+
+        self.thumbnail_ready.emit(path)
+
+    def _shrink(self):
+        while self._memory > self.max_memory and len(self._pixmaps) > 1:
+            self._evict(next(iter(self._pixmaps)))
+
+    def _evict(self, path):
+        self._memory -= self._pixmap_bytes(self._pixmaps.pop(path))
+        for badged in self._badges.pop(path, {}).values():
+            self._memory -= self._pixmap_bytes(badged)
+
+    @staticmethod
+    def _pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
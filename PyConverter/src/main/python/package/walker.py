@@ -0,0 +1,51 @@
+import os
+import glob
+import logging
+
+from package.cache import MANIFEST_FILENAME
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp"}
+
+
+def is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def iter_images(inputs, recursive=True, exclude=()):
+    # Paths are yielded as they are found, so the full list is never built
+    for input_path in inputs:
+        if any(char in input_path for char in "*?["):
+            for path in glob.iglob(input_path, recursive=True):
+                yield from _iter_path(path, recursive, exclude)
+        elif os.path.exists(input_path):
+            yield from _iter_path(input_path, recursive, exclude)
+        else:
+            logging.warning(f"Le chemin {input_path} n'existe pas.")
+
+
+def walk_directory(directory, recursive=True, exclude=()):
+    # Folders holding a conversion manifest are outputs of a previous run,
+    # whatever their name, and are never converted again
+    directories = [directory]
+    while directories:
+        current = directories.pop()
+        if os.path.exists(os.path.join(current, MANIFEST_FILENAME)):
+            logging.info(f"Dossier de sortie ignoré : {current}")
+            continue
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and entry.name not in exclude:
+                            directories.append(entry.path)
+                    elif is_image(entry.name):
+                        yield entry.path
+        except OSError as e:
+            logging.warning(f"Impossible de lire le dossier {current} : {e}")
+
+
+def _iter_path(path, recursive, exclude):
+    if os.path.isdir(path):
+        yield from walk_directory(path, recursive=recursive, exclude=exclude)
+    elif is_image(path):
+        yield path
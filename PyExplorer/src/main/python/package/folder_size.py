@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+
+from PySide2 import QtCore, QtWidgets
+
+CACHE_FILEPATH = os.path.join(Path.home(), ".cache", "pyexplorer", "folder_sizes.jsonl")
+SIZE_COLUMN = 1
+PROGRESS_INTERVAL = 0.2
+SAVE_DELAY = 5000
+CHECK_INTERVAL = 2.0
+VIRTUAL_FILESYSTEMS = ("/proc", "/sys")
+
+
+class FolderSizeCache:
+    # For every directory already scanned: its mtime, the size of the files it
+    # directly contains and the names of its subdirectories. Adding, removing
+    # or renaming an entry changes the directory's mtime, so only the
+    # directories whose mtime changed are listed again.
+    def __init__(self, path=CACHE_FILEPATH):
+        self.path = path
+        self._entries = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._load()
+
+    def get(self, directory, mtime_ns):
+        with self._lock:
+            entry = self._entries.get(directory)
+        if entry is not None and entry[0] == mtime_ns:
+            return entry[1], entry[2]
+        return None
+
+    def put(self, directory, mtime_ns, own_size, children):
+        with self._lock:
+            self._entries[directory] = [mtime_ns, own_size, children]
+            self._dirty = True
+
+    def save(self):
+        # Entries are replaced, never modified, so a copy of the dict is
+        # enough to write them without holding the lock. One line per
+        # directory: the walkers and the interface keep running between lines.
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = list(self._entries.items())
+                self._dirty = False
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                for directory, entry in entries:
+                    f.write(json.dumps([directory] + entry, separators=(",", ":")) + "\n")
+            os.replace(tmp_path, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        directory, *entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._entries[directory] = entry
+        except OSError:
+            self._entries = {}
+
+
+def scan_directory(directory, device):
+    # Files directly in the directory, and its subdirectories on the same
+    # filesystem; symbolic links are not followed
+    own_size = 0
+    children = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                stat = entry.stat(follow_symlinks=False)
+                if entry.is_dir(follow_symlinks=False):
+                    if stat.st_dev == device:
+                        children.append(entry.name)
+                else:
+                    own_size += stat.st_size
+            except OSError:
+                continue
+    return own_size, children
+
+
+class FolderSizeSignals(QtCore.QObject):
+    size_found = QtCore.Signal(str, object, bool, object)
+
+
+class FolderSizeWalker(QtCore.QRunnable):
+    def __init__(self, path, cache, signals, stop_event):
+        super().__init__()
+        self.path = path
+        self.cache = cache
+        self.signals = signals
+        self.stop_event = stop_event
+
+    def run(self):
+        # The total is sent every PROGRESS_INTERVAL while the tree is walked,
+        # so big folders show a growing size instead of nothing
+        total = 0
+        mtime_ns = None
+        stack = [self.path]
+        last_emit = time.monotonic()
+        while stack:
+            if self.stop_event.is_set():
+                return
+            directory = stack.pop()
+            try:
+                stat = os.stat(directory, follow_symlinks=False)
+                if mtime_ns is None:
+                    mtime_ns = stat.st_mtime_ns
+                cached = self.cache.get(directory, stat.st_mtime_ns)
+                if cached is None:
+                    cached = scan_directory(directory, stat.st_dev)
+                    self.cache.put(directory, stat.st_mtime_ns, *cached)
+            except OSError as e:
+                logging.debug(f"Dossier illisible {directory} : {e}")
+                continue
+
+            own_size, children = cached
+            total += own_size
+            stack.extend(os.path.join(directory, child) for child in children)
+
+            now = time.monotonic()
+            if now - last_emit >= PROGRESS_INTERVAL:
+                last_emit = now
+                self.signals.size_found.emit(self.path, total, False, mtime_ns)
+
+        self.signals.size_found.emit(self.path, total, True, mtime_ns)
+
+
+class FolderSizeModel(QtWidgets.QFileSystemModel):
+    # QFileSystemModel leaves the Size column empty for directories: their
+    # size is computed in the background when their row is painted. A size is
+    # computed again when the folder's mtime changed, or when the user opens
+    # one of the folders it is in (see refresh).
+    def __init__(self, parent=None, cache=None):
+        super().__init__(parent)
+        self.cache = cache or FolderSizeCache()
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, min(4, os.cpu_count() or 1)))
+        self.signals = FolderSizeSignals()
+        self.signals.size_found.connect(self._size_found)
+        self._stop_event = threading.Event()
+        self._sizes = {}
+        self._pending = set()
+        self._save_timer = QtCore.QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(SAVE_DELAY)
+        self._save_timer.timeout.connect(self._save_in_background)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if index.column() == SIZE_COLUMN and role == QtCore.Qt.DisplayRole and self.isDir(index):
+            return self._folder_size_text(self.filePath(index))
+        return super().data(index, role)
+
+    def clear_pending(self):
+        # Called when the window changes location: walks that haven't started
+        # yet are for folders that left the screen; data() queues them again
+        # if they are painted later
+        self.pool.clear()
+        self._pending.clear()
+
+    def refresh(self, path):
+        # The folders under path are walked again when painted; unchanged
+        # folders come from the disk cache, so only changed ones are listed
+        prefix = path.rstrip("/") + "/"
+        for known, (size, done, mtime_ns, checked) in list(self._sizes.items()):
+            if done and (known == path or known.startswith(prefix)):
+                self._sizes[known] = (size, False, mtime_ns, checked)
+
+    def stop(self):
+        self._save_timer.stop()
+        self._stop_event.set()
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.cache.save()
+
+    def _folder_size_text(self, path):
+        size = self._sizes.get(path)
+        if size is None or not size[1] or self._changed(path, size):
+            self._request(path)
+        if size is None:
+            return ""
+        text = QtCore.QLocale().formattedDataSize(size[0])
+        return text if size[1] else f"{text}…"
+
+    def _changed(self, path, size):
+        # A painted folder is checked every CHECK_INTERVAL at most
+        now = time.monotonic()
+        if now - size[3] < CHECK_INTERVAL:
+            return False
+        self._sizes[path] = size[:3] + (now,)
+        try:
+            return os.stat(path, follow_symlinks=False).st_mtime_ns != size[2]
+        except OSError:
+            return False
+
+    def _request(self, path):
+        if path in self._pending or any(path == directory or path.startswith(directory + "/")
+                                        for directory in VIRTUAL_FILESYSTEMS):
+            return
+        self._pending.add(path)
+        self.pool.start(FolderSizeWalker(path, self.cache, self.signals, self._stop_event))
+
+    def _size_found(self, path, size, done, mtime_ns):
+        self._sizes[path] = (size, done, mtime_ns, time.monotonic())
+        if done:
+            self._pending.discard(path)
+            if not self._pending:
+                self._save_timer.start()
+        index = self.index(path, SIZE_COLUMN)
+        if index.isValid():
+            self.dataChanged.emit(index, index, [QtCore.Qt.DisplayRole])
+
+    def _save_in_background(self):
+        threading.Thread(target=self.cache.save, name="folder-size-cache", daemon=True).start()
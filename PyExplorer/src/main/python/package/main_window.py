@@ -2,6 +2,8 @@ from functools import partial
 
 from PySide2 import QtWidgets, QtCore, QtGui
 
+from package.folder_size import FolderSizeModel
+
 
 # noinspection PyAttributeOutsideInit
 class MainWindow(QtWidgets.QMainWindow):
@@ -72,11 +74,13 @@ class MainWindow(QtWidgets.QMainWindow):
     def change_location(self, location):
         path = eval(f"QtCore.QStandardPaths().standardLocations(QtCore.QStandardPaths.{location.capitalize()}Location)")
         path = path[0]
+        self.model.clear_pending()
+        self.model.refresh(path)
         self.tree_view.setRootIndex(self.model.index(path))
         self.list_view.setRootIndex(self.model.index(path))
 
     def create_file_model(self):
-        self.model = QtWidgets.QFileSystemModel()
+        self.model = FolderSizeModel(parent=self)
         root_path = QtCore.QDir.rootPath()
         self.model.setRootPath(root_path)
         self.tree_view.setModel(self.model)
@@ -84,8 +88,13 @@ class MainWindow(QtWidgets.QMainWindow):
         self.list_view.setRootIndex(self.model.index(root_path))
         self.tree_view.setRootIndex(self.model.index(root_path))
 
+    def closeEvent(self, event):
+        self.model.stop()
+        event.accept()
+
     def treeview_clicked(self, index):
         if self.model.isDir(index):
+            self.model.refresh(self.model.filePath(index))
             self.list_view.setRootIndex(index)
         else:
             self.list_view.setRootIndex(index.parent())
@@ -95,4 +104,5 @@ class MainWindow(QtWidgets.QMainWindow):
         selection_model.setCurrentIndex(index, QtCore.QItemSelectionModel.ClearAndSelect)
 
     def listview_double_clicked(self, index):
+        self.model.refresh(self.model.filePath(index))
         self.list_view.setRootIndex(index)
\ No newline at end of file
@@ -1,4 +1,10 @@
 import os
 from pathlib import Path
 
-NOTES_DIR = os.path.join(Path.home(), ".notes")
\ No newline at end of file
+NOTES_DIR = os.path.join(Path.home(), ".notes")
+MANIFEST_FILEPATH = os.path.join(NOTES_DIR, ".manifest.json")
+INDEX_FILEPATH = os.path.join(NOTES_DIR, ".search_index.db")
+NOTES_DB_FILEPATH = os.path.join(NOTES_DIR, "notes.db")
+
+# "files" (one JSON file per note) or "sqlite" (a single database)
+STORAGE_BACKEND = os.environ.get("PYNOTES_STORAGE", "files")
@@ -0,0 +1,70 @@
+# A delta is [position, removed, added]: `removed` characters are replaced by
+# the `added` text at `position`, as reported by QTextDocument.contentsChange.
+
+
+def add_delta(deltas, position, removed, added):
+    # Consecutive keystrokes are merged into the previous delta so that a
+    # typed sentence is journaled as a single insertion
+    if deltas:
+        last = deltas[-1]
+        end = last[0] + len(last[2])
+        if not removed and position == end:
+            last[2] += added
+            return
+        if removed and not added and position + removed == end and position >= last[0]:
+            last[2] = last[2][:position - last[0]]
+            return
+    deltas.append([position, removed, added])
+
+
+def apply_deltas(text, deltas):
+    return "".join(source[start:end] for source, start, end in _pieces(text, deltas))
+
+
+def deltas_match(text, deltas, expected):
+    # Checks that the deltas turn text into expected without building the
+    # text after every delta
+    try:
+        pieces = _pieces(text, deltas)
+    except ValueError:
+        return False
+
+    if sum(end - start for _, start, end in pieces) != len(expected):
+        return False
+    offset = 0
+    for source, start, end in pieces:
+        if not expected.startswith(source[start:end], offset):
+            return False
+        offset += end - start
+    return True
+
+
+def _pieces(text, deltas):
+    # The result is kept as (source, start, end) slices of the original text
+    # and of the added texts: a delta only splits the slice it falls in
+    # instead of copying the whole text
+    pieces = [(text, 0, len(text))]
+    length = len(text)
+    for position, removed, added in deltas:
+        if position > length or position + removed > length:
+            raise ValueError("Modification hors du texte de la note.")
+
+        end_position = position + removed
+        spliced = []
+        offset = 0
+        inserted = False
+        for source, start, end in pieces:
+            piece_start, offset = offset, offset + end - start
+            if piece_start < position:
+                spliced.append((source, start, start + min(offset, position) - piece_start))
+            if offset > end_position:
+                if not inserted:
+                    spliced.append((added, 0, len(added)))
+                    inserted = True
+                spliced.append((source, start + max(0, end_position - piece_start), end))
+        if not inserted:
+            spliced.append((added, 0, len(added)))
+
+        pieces = [piece for piece in spliced if piece[1] < piece[2]]
+        length += len(added) - removed
+    return pieces
@@ -0,0 +1,45 @@
+import sys
+import logging
+import argparse
+
+from package.api.storage import BACKENDS, create_storage
+
+
+def migrate(source, destination, delete=False):
+    # Notes keep their uuid, so migrating back and forth is lossless
+    count = 0
+    for uuid, _ in source.list():
+        destination.write(uuid, source.read(uuid))
+        if delete:
+            source.delete(uuid)
+        count += 1
+    return count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Copie les notes d'un stockage vers un autre.")
+    parser.add_argument("source", choices=BACKENDS)
+    parser.add_argument("destination", choices=BACKENDS)
+    parser.add_argument("--delete", action="store_true", help="Supprime les notes du stockage source après la copie.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.source == args.destination:
+        logging.error("Les stockages source et destination sont identiques.")
+        return 1
+
+    source = create_storage(args.source)
+    destination = create_storage(args.destination)
+    try:
+        count = migrate(source, destination, delete=args.delete)
+    finally:
+        source.close()
+        destination.close()
+    print(f"{count} notes copiées de {args.source} vers {args.destination}.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
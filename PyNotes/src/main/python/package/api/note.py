@@ -1,28 +1,109 @@
-import os
-import json
+import threading
 from uuid import uuid4
-from glob import glob
+from collections import OrderedDict
 
-from package.api.constants import NOTES_DIR
+from package.api.storage import create_storage
 
+CONTENT_CACHE_CHARS = 16 * 1024 * 1024
+JOURNAL_MIN_BYTES = 64 * 1024
+JOURNAL_RATIO = 0.5
+JOURNAL_MAX_DELTAS = 500
 
-def get_notes():
-    notes = []
-    fichiers = glob(os.path.join(NOTES_DIR, "*.json"))
-    for fichier in fichiers:
-        with open(fichier, "r") as f:
-            note_data = json.load(f)
-            note_uuid = os.path.splitext(os.path.basename(fichier))[0]
-            note_title = note_data.get("title")
-            note_content = note_data.get("content")
-            note = Note(uuid=note_uuid, title=note_title, content=note_content)
-            notes.append(note)
+# Objects with note_saved(uuid, data) and note_deleted(uuid) methods, told
+# about every note written or deleted (the search index)
+listeners = []
+
+_storage = None
+_storage_lock = threading.Lock()
 
-    return notes
+
+def get_notes():
+    # Only the titles are read, the contents are loaded when needed
+    return [Note(uuid=note_uuid, title=title, content=None) for note_uuid, title in get_storage().list()]
+
+
+def get_storage():
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_storage()
+        return _storage
+
+
+def set_storage(storage):
+    global _storage
+    with _storage_lock:
+        _storage = storage
+    content_cache.clear()
+
+
+class ContentCache:
+    # Note contents loaded from disk, the least recently used are dropped
+    # once they take more than max_chars. Contents waiting to be written are
+    # pinned: they are newer than the disk, so they can't be dropped before
+    # the writer is done with them.
+    def __init__(self, max_chars=CONTENT_CACHE_CHARS):
+        self.max_chars = max_chars
+        self._contents = OrderedDict()
+        self._pinned = {}
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, uuid):
+        with self._lock:
+            content = self._pinned.get(uuid)
+            if content is not None:
+                return content
+            content = self._contents.get(uuid)
+            if content is not None:
+                self._contents.move_to_end(uuid)
+            return content
+
+    def put(self, uuid, content):
+        with self._lock:
+            self._put(uuid, content)
+
+    def pin(self, uuid, content):
+        with self._lock:
+            self._discard(uuid)
+            self._pinned[uuid] = content
+
+    def unpin(self, uuid):
+        with self._lock:
+            content = self._pinned.pop(uuid, None)
+            if content is not None:
+                self._put(uuid, content)
+
+    def discard(self, uuid):
+        with self._lock:
+            self._pinned.pop(uuid, None)
+            self._discard(uuid)
+
+    def clear(self):
+        with self._lock:
+            self._contents.clear()
+            self._pinned.clear()
+            self._chars = 0
+
+    def _put(self, uuid, content):
+        self._discard(uuid)
+        self._contents[uuid] = content
+        self._chars += len(content)
+        while self._chars > self.max_chars and len(self._contents) > 1:
+            self._chars -= len(self._contents.popitem(last=False)[1])
+
+    def _discard(self, uuid):
+        content = self._contents.pop(uuid, None)
+        if content is not None:
+            self._chars -= len(content)
+
+
+content_cache = ContentCache()
 
 
 class Note:
     def __init__(self, title="", content="", uuid=None):
+        # With content=None the content is read from the file on first access
         if uuid:
             self.uuid = uuid
         else:
@@ -39,32 +120,59 @@ class Note:
 
     @property
     def content(self):
-        return self._content
+        if self._content is not None:
+            return self._content
+
+        content = content_cache.get(self.uuid)
+        if content is None:
+            content = get_storage().read(self.uuid).get("content") or ""
+            content_cache.put(self.uuid, content)
+        return content
 
     @content.setter
     def content(self, value):
         if isinstance(value, str):
             self._content = value
+        elif value is None:
+            self._content = None
         else:
             raise TypeError("Valeur invalide (besoin d'une chaîne de caractères).")
 
     def delete(self):
-        os.remove(self.path)
-        if os.path.exists(self.path):
+        content_cache.discard(self.uuid)
+        if not get_storage().delete(self.uuid):
             return False
+
+        for listener in listeners:
+            listener.note_deleted(self.uuid)
         return True
 
-    @property
-    def path(self):
-        return os.path.join(NOTES_DIR, self.uuid + ".json")
+    def data(self):
+        return {"title": self.title, "content": self.content}
 
     def save(self):
-        if not os.path.exists(NOTES_DIR):
-            os.makedirs(NOTES_DIR)
-
-        data = {"title": self.title, "content": self.content}
-        with open(self.path, "w") as f:
-            json.dump(data, f, indent=4)
+        write_note(self.uuid, self.data())
+
+
+def write_note(note_uuid, data, deltas=None):
+    # With deltas, only the edits are appended to the note's journal; the
+    # whole note is written again, which compacts the journal, once it gets
+    # too big compared to the note or when it was rewritten since the edits'
+    # base version
+    storage = get_storage()
+    journaled = (bool(deltas) and not _needs_compaction(storage, note_uuid, data, deltas)
+                 and storage.append_journal(note_uuid, deltas))
+    if not journaled:
+        storage.write(note_uuid, data)
+    for listener in listeners:
+        listener.note_saved(note_uuid, data)
+
+
+def _needs_compaction(storage, note_uuid, data, deltas):
+    size, count = storage.journal_stats(note_uuid)
+    size += sum(len(delta[2]) for delta in deltas)
+    limit = max(JOURNAL_MIN_BYTES, len(data.get("content") or "") * JOURNAL_RATIO)
+    return size > limit or count + len(deltas) > JOURNAL_MAX_DELTAS
 
 
 if __name__ == '__main__':
@@ -0,0 +1,225 @@
+import os
+import re
+import json
+import sqlite3
+import math
+import queue
+import logging
+import threading
+import unicodedata
+
+from package.api.constants import INDEX_FILEPATH
+from package.api.note import get_storage
+from package.api.storage import transaction
+
+LEGACY_INDEX_FILENAME = ".search_index.json"
+TOKEN_PATTERN = re.compile(r"\w+")
+SYNC_BATCH_SIZE = 500
+CACHE_KB = 32 * 1024
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_TOKENS = 100
+TITLE_BOOST = 3.0
+PREFIX_WEIGHT = 0.5
+PHRASE_BONUS = 2.0
+
+
+def tokenize(text):
+    # Accents and case are ignored so that "ete" finds "Été"
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(char for char in text if not unicodedata.combining(char))
+    return TOKEN_PATTERN.findall(text)
+
+
+def _positions(tokens):
+    positions = {}
+    for position, token in enumerate(tokens):
+        positions.setdefault(token, []).append(position)
+    return positions
+
+
+class SearchIndex:
+    # Inverted index (token -> uuid -> positions) of the title and content of
+    # every note, stored in SQLite: indexing a note only replaces its own rows
+    # and a query only reads the postings of its terms, so the index is never
+    # loaded nor written as a whole. The index is only modified by its
+    # background thread; queries use their own connection.
+    def __init__(self, path=INDEX_FILEPATH, storage=None):
+        self.path = path
+        self.storage = storage or get_storage()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._jobs = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="search-index", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._jobs.put(None)
+        self._thread.join()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def note_saved(self, uuid, data):
+        self._jobs.put(("index", uuid, data))
+
+    def note_deleted(self, uuid):
+        self._jobs.put(("remove", uuid))
+
+    def search(self, text, limit=None):
+        terms = tokenize(text)
+        if not terms:
+            return []
+
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            connection = self._connection
+            total = max(connection.execute("SELECT count(*) FROM notes").fetchone()[0], 1)
+            scores = None
+            matches = []
+            for term in terms:
+                # Every term can be the beginning of a word, and all of them
+                # must be found in a note
+                term_scores = {}
+                term_positions = {}
+                for token, note_count in self._expand(connection, term):
+                    weight = (1.0 if token == term else PREFIX_WEIGHT) * math.log(1 + total / note_count)
+                    rows = connection.execute("SELECT postings.uuid, positions, title_length FROM postings "
+                                              "JOIN notes ON notes.uuid = postings.uuid WHERE token = ?",
+                                              (token,))
+                    for uuid, positions, title_length in rows:
+                        positions = [int(position) for position in positions.split()]
+                        boost = TITLE_BOOST if positions[0] < title_length else 1.0
+                        term_scores[uuid] = term_scores.get(uuid, 0.0) + weight * boost * math.sqrt(len(positions))
+                        term_positions.setdefault(uuid, []).extend(positions)
+
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {uuid: score + term_scores[uuid] for uuid, score in scores.items()
+                              if uuid in term_scores}
+                matches.append(term_positions)
+                if not scores:
+                    return []
+
+        # Terms found next to each other, in the same order, rank higher
+        for previous, following in zip(matches, matches[1:]):
+            for uuid in scores:
+                following_positions = set(following[uuid])
+                if any(position + 1 in following_positions for position in previous[uuid]):
+                    scores[uuid] += PHRASE_BONUS
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        return ranked[:limit] if limit else ranked
+
+    @staticmethod
+    def _expand(connection, term):
+        # A single letter would match most of the index: only the exact token
+        # is used until the term gets longer
+        if len(term) < MIN_PREFIX_LENGTH:
+            return connection.execute("SELECT token, note_count FROM tokens WHERE token = ?", (term,)).fetchall()
+
+        end = term[:-1] + chr(ord(term[-1]) + 1)
+        return connection.execute("SELECT token, note_count FROM tokens WHERE token >= ? AND token < ? "
+                                  "ORDER BY token LIMIT ?", (term, end, MAX_PREFIX_TOKENS)).fetchall()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA cache_size=-{CACHE_KB}")
+        connection.execute("""CREATE TABLE IF NOT EXISTS notes (
+                                  uuid TEXT PRIMARY KEY,
+                                  signature TEXT NOT NULL,
+                                  title_length INTEGER NOT NULL,
+                                  tokens TEXT NOT NULL)""")
+        connection.execute("""CREATE TABLE IF NOT EXISTS tokens (
+                                  token TEXT PRIMARY KEY,
+                                  note_count INTEGER NOT NULL) WITHOUT ROWID""")
+        connection.execute("""CREATE TABLE IF NOT EXISTS postings (
+                                  token TEXT NOT NULL,
+                                  uuid TEXT NOT NULL,
+                                  positions TEXT NOT NULL,
+                                  PRIMARY KEY (token, uuid)) WITHOUT ROWID""")
+        return connection
+
+    def _run(self):
+        connection = self._connect()
+        legacy_path = os.path.join(os.path.dirname(self.path), LEGACY_INDEX_FILENAME)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        self._sync(connection)
+
+        running = True
+        while running:
+            # Updates queued meanwhile are applied in the same transaction
+            jobs = [self._jobs.get()]
+            while True:
+                try:
+                    jobs.append(self._jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            with transaction(connection):
+                for job in jobs:
+                    if job is None:
+                        running = False
+                    elif job[0] == "index":
+                        _, uuid, data = job
+                        self._index(connection, uuid, data, self.storage.signature(uuid))
+                    else:
+                        self._remove(connection, job[1])
+        connection.close()
+
+    def _index(self, connection, uuid, data, signature):
+        title_tokens = tokenize(data.get("title") or "")
+        positions = _positions(title_tokens + tokenize(data.get("content") or ""))
+        self._remove(connection, uuid)
+        connection.execute("INSERT INTO notes (uuid, signature, title_length, tokens) VALUES (?, ?, ?, ?)",
+                           (uuid, json.dumps(signature), len(title_tokens), " ".join(positions)))
+        connection.executemany("INSERT INTO postings (token, uuid, positions) VALUES (?, ?, ?)",
+                               ((token, uuid, " ".join(map(str, token_positions)))
+                                for token, token_positions in positions.items()))
+        connection.executemany("INSERT INTO tokens (token, note_count) VALUES (?, 1) "
+                               "ON CONFLICT (token) DO UPDATE SET note_count = note_count + 1",
+                               ((token,) for token in positions))
+
+    @staticmethod
+    def _remove(connection, uuid):
+        # The tokens of the note are kept with it, so its postings are found
+        # by their primary key
+        row = connection.execute("SELECT tokens FROM notes WHERE uuid = ?", (uuid,)).fetchone()
+        if row is None:
+            return
+        tokens = row[0].split()
+        connection.executemany("DELETE FROM postings WHERE token = ? AND uuid = ?", ((token, uuid) for token in tokens))
+        connection.executemany("UPDATE tokens SET note_count = note_count - 1 WHERE token = ?",
+                               ((token,) for token in tokens))
+        connection.executemany("DELETE FROM tokens WHERE token = ? AND note_count <= 0", ((token,) for token in tokens))
+        connection.execute("DELETE FROM notes WHERE uuid = ?", (uuid,))
+
+    def _sync(self, connection):
+        # Notes changed outside of the application since they were indexed
+        # are indexed again; only those are read
+        indexed = {uuid: json.loads(signature)
+                   for uuid, signature in connection.execute("SELECT uuid, signature FROM notes")}
+        signatures = self.storage.signatures()
+        changed = [uuid for uuid, signature in signatures.items() if indexed.get(uuid) != signature]
+        removed = [uuid for uuid in indexed if uuid not in signatures]
+
+        for start in range(0, len(changed), SYNC_BATCH_SIZE):
+            with transaction(connection):
+                for uuid in changed[start:start + SYNC_BATCH_SIZE]:
+                    try:
+                        self._index(connection, uuid, self.storage.read(uuid), signatures[uuid])
+                    except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+                        logging.error(f"Impossible d'indexer la note {uuid} : {e}")
+        with transaction(connection):
+            for uuid in removed:
+                self._remove(connection, uuid)
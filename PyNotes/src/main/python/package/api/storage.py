@@ -0,0 +1,356 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from package.api.constants import NOTES_DIR, MANIFEST_FILEPATH, NOTES_DB_FILEPATH, STORAGE_BACKEND
+from package.api.journal import apply_deltas
+
+
+class FileStorage:
+    # One JSON file per note, plus a manifest of the titles so that listing
+    # the notes doesn't parse every file. Edits saved since the last snapshot
+    # are appended to <uuid>.journal, one delta per line, after a header with
+    # the mtime and size of the snapshot they apply to: a journal left over by
+    # a crash after a new snapshot is ignored instead of replayed twice.
+    def __init__(self, notes_dir=NOTES_DIR, manifest_path=MANIFEST_FILEPATH):
+        self.notes_dir = notes_dir
+        self.manifest_path = manifest_path
+        self._journal_counts = {}
+        self._snapshots = {}
+
+    def path(self, uuid):
+        return os.path.join(self.notes_dir, uuid + ".json")
+
+    def journal_path(self, uuid):
+        return os.path.join(self.notes_dir, uuid + ".journal")
+
+    def list(self):
+        # Only the notes whose file changed since the manifest was written
+        # (or that are not in it yet) are parsed again
+        manifest = self._read_manifest()
+        entries = {}
+        for entry in self._scan():
+            uuid = os.path.splitext(entry.name)[0]
+            stat = entry.stat()
+            cached = manifest.get(uuid)
+            if cached and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+                title = cached["title"]
+            else:
+                try:
+                    title = self.read(uuid).get("title")
+                except (OSError, ValueError) as e:
+                    logging.error(f"Impossible de lire la note {entry.path} : {e}")
+                    continue
+            entries[uuid] = {"title": title, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+        if entries != manifest:
+            write_json(self.manifest_path, entries)
+        return [(uuid, entry["title"]) for uuid, entry in entries.items()]
+
+    def signatures(self):
+        return {os.path.splitext(entry.name)[0]: self.signature(os.path.splitext(entry.name)[0])
+                for entry in self._scan()}
+
+    def signature(self, uuid):
+        try:
+            stat = os.stat(self.path(uuid))
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size, self._journal_size(uuid)]
+
+    def read(self, uuid):
+        # Edits journaled after the snapshot are replayed, which also recovers
+        # them after a crash; a journal damaged by a crash is replaced by a
+        # new snapshot holding what could be recovered
+        with open(self.path(uuid), "r") as f:
+            data = json.load(f)
+            stat = os.fstat(f.fileno())
+        # The deltas of the application are computed against the first
+        # version it read, or the last one it wrote
+        self._snapshots.setdefault(uuid, [stat.st_mtime_ns, stat.st_size])
+        deltas, damaged = self._read_journal(uuid)
+        if deltas:
+            try:
+                data["content"] = apply_deltas(data.get("content") or "", deltas)
+            except ValueError:
+                damaged = True
+        if damaged:
+            logging.warning(f"Journal endommagé pour la note {uuid}, une nouvelle version complète est écrite.")
+            self.write(uuid, data)
+        return data
+
+    def write(self, uuid, data):
+        write_json(self.path(uuid), data, indent=4)
+        self._journal_counts.pop(uuid, None)
+        if os.path.exists(self.journal_path(uuid)):
+            os.remove(self.journal_path(uuid))
+        self._snapshots[uuid] = self._snapshot_signature(uuid)
+
+    def append_journal(self, uuid, deltas):
+        # Returns False, without writing anything, when the note was
+        # rewritten outside of the application since the deltas' base: the
+        # caller then writes the whole note
+        snapshot = self._snapshot_signature(uuid)
+        if self._snapshots.get(uuid) != snapshot:
+            return False
+
+        lines = [json.dumps(delta) for delta in deltas]
+        mode = "a"
+        self._truncate_journal(uuid)
+        counted = self._journal_counts.pop(uuid, None)
+        count = counted[1] if counted is not None and counted[0] == self._journal_size(uuid) else None
+        if self._journal_header(uuid) != snapshot:
+            # No journal yet, or one left over from an older snapshot
+            lines.insert(0, json.dumps({"snapshot": snapshot}))
+            mode = "w"
+            count = 0
+        with open(self.journal_path(uuid), mode) as f:
+            f.write("".join(line + "\n" for line in lines))
+
+        if count is not None:
+            self._journal_counts[uuid] = (self._journal_size(uuid), count + len(deltas))
+        return True
+
+    def journal_stats(self, uuid):
+        # The number of deltas is kept for the journal size it was counted
+        # at, so the journal is only parsed again when another process wrote
+        # to it
+        size = self._journal_size(uuid)
+        if not size:
+            return 0, 0
+        counted = self._journal_counts.get(uuid)
+        if counted is None or counted[0] != size:
+            counted = self._journal_counts[uuid] = (size, len(self._read_journal(uuid)[0]))
+        return counted
+
+    def delete(self, uuid):
+        self._journal_counts.pop(uuid, None)
+        self._snapshots.pop(uuid, None)
+        if os.path.exists(self.journal_path(uuid)):
+            os.remove(self.journal_path(uuid))
+        os.remove(self.path(uuid))
+        return not os.path.exists(self.path(uuid))
+
+    def _journal_size(self, uuid):
+        try:
+            return os.path.getsize(self.journal_path(uuid))
+        except OSError:
+            return 0
+
+    def _snapshot_signature(self, uuid):
+        stat = os.stat(self.path(uuid))
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def _truncate_journal(self, uuid):
+        # A line cut by a crash is removed, otherwise the next deltas would be
+        # appended to it and lost with it
+        try:
+            with open(self.journal_path(uuid), "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                if not f.tell():
+                    return
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) == b"\n":
+                    return
+                f.seek(0)
+                f.truncate(f.read().rfind(b"\n") + 1)
+        except OSError:
+            pass
+
+    def _journal_header(self, uuid):
+        try:
+            with open(self.journal_path(uuid), "r") as f:
+                return json.loads(f.readline()).get("snapshot")
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def _read_journal(self, uuid):
+        # Returns the deltas and whether a damaged line was dropped
+        try:
+            with open(self.journal_path(uuid), "r") as f:
+                header = json.loads(f.readline())
+                if header.get("snapshot") != self._snapshot_signature(uuid):
+                    return [], False
+
+                deltas = []
+                for line in f:
+                    try:
+                        deltas.append(json.loads(line))
+                    except ValueError:
+                        # A line cut by a crash is the last one, and is dropped
+                        return deltas, True
+                return deltas, False
+        except (OSError, ValueError, AttributeError):
+            return [], False
+
+    def close(self):
+        pass
+
+    def _scan(self):
+        if not os.path.isdir(self.notes_dir):
+            return
+        for entry in os.scandir(self.notes_dir):
+            if not entry.name.startswith(".") and entry.name.endswith(".json"):
+                yield entry
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+class SQLiteStorage:
+    # Every note in a single SQLite database (WAL journal): listing reads the
+    # titles only and saving a note is one statement in one file. Edits saved
+    # since the last snapshot are rows of the journal table, whose size and
+    # count are kept up to date in the notes table.
+    def __init__(self, path=NOTES_DB_FILEPATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=10)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS notes (
+                                        uuid TEXT PRIMARY KEY,
+                                        title TEXT NOT NULL,
+                                        content TEXT NOT NULL,
+                                        mtime_ns INTEGER NOT NULL,
+                                        journal_bytes INTEGER NOT NULL DEFAULT 0,
+                                        journal_count INTEGER NOT NULL DEFAULT 0)""")
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS journal (
+                                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                        uuid TEXT NOT NULL,
+                                        delta TEXT NOT NULL)""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS journal_uuid ON journal (uuid)")
+        self._add_journal_columns()
+
+    def list(self):
+        with self._lock:
+            return self._connection.execute("SELECT uuid, title FROM notes ORDER BY rowid").fetchall()
+
+    def signatures(self):
+        with self._lock:
+            rows = self._connection.execute("SELECT uuid, mtime_ns, length(content) FROM notes").fetchall()
+        return {uuid: [mtime_ns, size] for uuid, mtime_ns, size in rows}
+
+    def signature(self, uuid):
+        with self._lock:
+            row = self._connection.execute("SELECT mtime_ns, length(content) FROM notes WHERE uuid = ?",
+                                           (uuid,)).fetchone()
+        return list(row) if row else None
+
+    def read(self, uuid):
+        # Journal rows that don't apply to the note are dropped by writing it
+        # again without them
+        with self._lock:
+            row = self._connection.execute("SELECT title, content, mtime_ns FROM notes WHERE uuid = ?",
+                                           (uuid,)).fetchone()
+            deltas = self._connection.execute("SELECT delta FROM journal WHERE uuid = ? ORDER BY id",
+                                              (uuid,)).fetchall()
+        if row is None:
+            raise KeyError(uuid)
+
+        self._snapshots.setdefault(uuid, row[2])
+        data = {"title": row[0], "content": row[1]}
+        try:
+            data["content"] = apply_deltas(row[1], [json.loads(delta) for delta, in deltas])
+        except ValueError:
+            logging.warning(f"Journal endommagé pour la note {uuid}, une nouvelle version complète est écrite.")
+            self.write(uuid, data)
+        return data
+
+    def write(self, uuid, data):
+        mtime_ns = time.time_ns()
+        with self._lock, transaction(self._connection):
+            # An upsert keeps the rowid, and so the note's place in list()
+            self._connection.execute("INSERT INTO notes (uuid, title, content, mtime_ns, journal_bytes, journal_count) "
+                                     "VALUES (?, ?, ?, ?, 0, 0) ON CONFLICT (uuid) DO UPDATE SET "
+                                     "title = excluded.title, content = excluded.content, "
+                                     "mtime_ns = excluded.mtime_ns, journal_bytes = 0, journal_count = 0",
+                                     (uuid, data.get("title") or "", data.get("content") or "", mtime_ns))
+            self._connection.execute("DELETE FROM journal WHERE uuid = ?", (uuid,))
+            self._snapshots[uuid] = mtime_ns
+
+    def append_journal(self, uuid, deltas):
+        # Returns False when another instance wrote the note since this one
+        # last read or wrote it: the caller then writes the whole note
+        rows = [(uuid, json.dumps(delta)) for delta in deltas]
+        mtime_ns = time.time_ns()
+        with self._lock, transaction(self._connection):
+            updated = self._connection.execute("UPDATE notes SET mtime_ns = ?, journal_bytes = journal_bytes + ?, "
+                                               "journal_count = journal_count + ? WHERE uuid = ? AND mtime_ns = ?",
+                                               (mtime_ns, sum(len(delta) for _, delta in rows), len(rows), uuid,
+                                                self._snapshots.get(uuid))).rowcount
+            if not updated:
+                return False
+            self._connection.executemany("INSERT INTO journal (uuid, delta) VALUES (?, ?)", rows)
+            self._snapshots[uuid] = mtime_ns
+        return True
+
+    def journal_stats(self, uuid):
+        with self._lock:
+            row = self._connection.execute("SELECT journal_bytes, journal_count FROM notes WHERE uuid = ?",
+                                           (uuid,)).fetchone()
+        return tuple(row) if row else (0, 0)
+
+    def delete(self, uuid):
+        self._snapshots.pop(uuid, None)
+        with self._lock, transaction(self._connection):
+            self._connection.execute("DELETE FROM journal WHERE uuid = ?", (uuid,))
+            return self._connection.execute("DELETE FROM notes WHERE uuid = ?", (uuid,)).rowcount > 0
+
+    def _add_journal_columns(self):
+        # Databases created before the counters get them, counted once
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(notes)")}
+        if "journal_count" in columns:
+            return
+        with transaction(self._connection):
+            self._connection.execute("ALTER TABLE notes ADD COLUMN journal_bytes INTEGER NOT NULL DEFAULT 0")
+            self._connection.execute("ALTER TABLE notes ADD COLUMN journal_count INTEGER NOT NULL DEFAULT 0")
+            self._connection.execute("""UPDATE notes SET
+                                            journal_bytes = (SELECT coalesce(sum(length(delta)), 0)
+                                                             FROM journal WHERE journal.uuid = notes.uuid),
+                                            journal_count = (SELECT count(*)
+                                                             FROM journal WHERE journal.uuid = notes.uuid)""")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+BACKENDS = {"files": FileStorage, "sqlite": SQLiteStorage}
+
+
+def create_storage(backend=STORAGE_BACKEND):
+    return BACKENDS[backend]()
+
+
+@contextmanager
+def transaction(connection):
+    # BEGIN IMMEDIATE takes the write lock at once, so two writers wait for
+    # each other instead of failing when their reads turn into writes
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def write_json(path, data, indent=None):
+    # The file is written next to its final path then renamed, so a crash
+    # mid-write leaves the previous version intact
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=indent)
+    os.replace(tmp_path, path)
@@ -0,0 +1,65 @@
+import logging
+import sqlite3
+import threading
+
+from package.api.note import content_cache, write_note
+
+
+class NoteWriter:
+    # Writes notes on a background thread. Saving the same note several times
+    # before it is written only keeps the last version, with all their edits.
+    def __init__(self):
+        self._pending = {}
+        self._writing = 0
+        self._running = True
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="note-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, note, deltas=None):
+        # Without deltas the whole note is written
+        with self._condition:
+            pending = self._pending.get(note.uuid)
+            if pending is not None:
+                deltas = pending[1] + deltas if pending[1] is not None and deltas is not None else None
+            data = note.data()
+            self._pending[note.uuid] = (data, deltas)
+            content_cache.pin(note.uuid, data["content"])
+            self._condition.notify_all()
+
+    def discard(self, note):
+        with self._condition:
+            self._pending.pop(note.uuid, None)
+            content_cache.unpin(note.uuid)
+
+    def flush(self):
+        with self._condition:
+            self._condition.wait_for(lambda: not self._pending and not self._writing)
+
+    def stop(self):
+        self.flush()
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or not self._running)
+                if not self._pending:
+                    return
+                uuid = next(iter(self._pending))
+                data, deltas = self._pending.pop(uuid)
+                self._writing += 1
+
+            try:
+                write_note(uuid, data, deltas)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                logging.error(f"Impossible d'enregistrer la note {uuid} : {e}")
+            finally:
+                with self._condition:
+                    self._writing -= 1
+                    if uuid not in self._pending:
+                        content_cache.unpin(uuid)
+                    self._condition.notify_all()
@@ -1,6 +1,13 @@
-from PySide2 import QtWidgets, QtGui
+from PySide2 import QtWidgets, QtCore, QtGui
 
+from package.api import note as note_api
+from package.api.journal import add_delta, deltas_match
 from package.api.note import Note, get_notes
+from package.api.search import SearchIndex
+from package.api.writer import NoteWriter
+
+AUTOSAVE_DELAY = 1000
+MAX_RANKED_RESULTS = 200
 
 
 class MainWindow(QtWidgets.QWidget):
@@ -8,6 +15,17 @@ class MainWindow(QtWidgets.QWidget):
         super().__init__()
         self.ctx = ctx
         self.setWindowTitle("PyNotes")
+        self.dirty_note = None
+        self.deltas = []
+        self.writer = NoteWriter()
+        self.search_index = SearchIndex()
+        note_api.listeners.append(self.search_index)
+        self.search_index.start()
+        self.note_items = {}
+        self.visible_uuids = None
+        self.autosave_timer = QtCore.QTimer(self)
+        self.autosave_timer.setSingleShot(True)
+        self.autosave_timer.setInterval(AUTOSAVE_DELAY)
 
         self.setup_ui()
         self.populate_notes()
@@ -21,6 +39,7 @@ class MainWindow(QtWidgets.QWidget):
 
     def create_widgets(self):
         self.btn_createNote = QtWidgets.QPushButton("Créer une note")
+        self.le_search = QtWidgets.QLineEdit()
         self.lw_notes = QtWidgets.QListWidget()
         self.te_contenu = QtWidgets.QTextEdit()
 
@@ -29,17 +48,24 @@ class MainWindow(QtWidgets.QWidget):
         with open(css_file, "r") as f:
             self.setStyleSheet(f.read())
 
+        self.le_search.setPlaceholderText("Rechercher...")
+        self.le_search.setClearButtonEnabled(True)
+
     def create_layouts(self):
         self.main_layout = QtWidgets.QGridLayout(self)
 
     def add_widgets_to_layouts(self):
         self.main_layout.addWidget(self.btn_createNote, 0, 0, 1, 1)
-        self.main_layout.addWidget(self.lw_notes, 1, 0, 1, 1)
-        self.main_layout.addWidget(self.te_contenu, 0, 1, 2, 1)
+        self.main_layout.addWidget(self.le_search, 1, 0, 1, 1)
+        self.main_layout.addWidget(self.lw_notes, 2, 0, 1, 1)
+        self.main_layout.addWidget(self.te_contenu, 0, 1, 3, 1)
 
     def setup_connections(self):
         self.btn_createNote.clicked.connect(self.create_note)
-        self.te_contenu.textChanged.connect(self.save_note)
+        self.le_search.textChanged.connect(self.filter_notes)
+        self.te_contenu.textChanged.connect(self.note_changed)
+        self.te_contenu.document().contentsChange.connect(self.record_change)
+        self.autosave_timer.timeout.connect(self.save_note)
         self.lw_notes.itemSelectionChanged.connect(self.populate_note_content)
         QtWidgets.QShortcut(QtGui.QKeySequence("Backspace"), self.lw_notes, self.delete_selected_note)
 
@@ -49,6 +75,7 @@ class MainWindow(QtWidgets.QWidget):
         lw_item = QtWidgets.QListWidgetItem(note.title)
         lw_item.note = note
         self.lw_notes.addItem(lw_item)
+        self.note_items[note.uuid] = lw_item
 
     def create_note(self):
         titre, resultat = QtWidgets.QInputDialog.getText(self, "Ajouter une note", "Titre: ")
@@ -60,10 +87,42 @@ class MainWindow(QtWidgets.QWidget):
     def delete_selected_note(self):
         selected_item = self.get_selected_lw_item()
         if selected_item:
+            if self.dirty_note is selected_item.note:
+                self.autosave_timer.stop()
+                self.dirty_note = None
+                self.deltas = []
+            self.writer.discard(selected_item.note)
+            self.writer.flush()
             resultat = selected_item.note.delete()
             if resultat:
+                self.note_items.pop(selected_item.note.uuid, None)
                 self.lw_notes.takeItem(self.lw_notes.row(selected_item))
 
+    def filter_notes(self, text):
+        # Only the items whose visibility changes are touched, and the
+        # matching notes are moved to the top of the list by rank
+        ranked = self.search_index.search(text) if text.strip() else None
+        uuids = set(ranked) if ranked is not None else set(self.note_items)
+        previous = self.visible_uuids if self.visible_uuids is not None else set(self.note_items)
+        for uuid in previous - uuids:
+            if uuid in self.note_items:
+                self.note_items[uuid].setHidden(True)
+        for uuid in uuids - previous:
+            if uuid in self.note_items:
+                self.note_items[uuid].setHidden(False)
+        self.visible_uuids = None if ranked is None else uuids
+
+        if ranked:
+            selected_item = self.get_selected_lw_item()
+            self.lw_notes.blockSignals(True)
+            for row, uuid in enumerate(ranked[:MAX_RANKED_RESULTS]):
+                lw_item = self.note_items.get(uuid)
+                if lw_item is not None:
+                    self.lw_notes.insertItem(row, self.lw_notes.takeItem(self.lw_notes.row(lw_item)))
+            if selected_item is not None:
+                self.lw_notes.setCurrentItem(selected_item)
+            self.lw_notes.blockSignals(False)
+
     def get_selected_lw_item(self):
         selected_items = self.lw_notes.selectedItems()
         if selected_items:
@@ -76,15 +135,57 @@ class MainWindow(QtWidgets.QWidget):
             self.add_note_to_listwidget(note)
 
     def populate_note_content(self):
+        # The note being edited is saved before its text is replaced
+        self.save_note()
+        self.deltas = []
         selected_item = self.get_selected_lw_item()
+        self.te_contenu.blockSignals(True)
         if selected_item:
             self.te_contenu.setText(selected_item.note.content)
         else:
             self.te_contenu.clear()
+        self.te_contenu.blockSignals(False)
 
-    def save_note(self):
+    def note_changed(self):
+        # Keystrokes only restart the timer; the text is read and saved once
+        # typing stops for AUTOSAVE_DELAY
         selected_item = self.get_selected_lw_item()
         if selected_item:
-            selected_item.note.content = self.te_contenu.toPlainText()
-            selected_item.note.save()
+            self.dirty_note = selected_item.note
+            self.autosave_timer.start()
+
+    def record_change(self, position, removed, added):
+        # Edits are recorded so that only them are written, not the whole note
+        if self.te_contenu.signalsBlocked():
+            return
+        cursor = QtGui.QTextCursor(self.te_contenu.document())
+        cursor.setPosition(position)
+        cursor.setPosition(position + added, QtGui.QTextCursor.KeepAnchor)
+        text = cursor.selectedText().replace("\u2029", "\n").replace("\u2028", "\n")
+        add_delta(self.deltas, position, removed, text)
+
+    def save_note(self):
+        self.autosave_timer.stop()
+        if self.dirty_note is None:
+            return
+
+        # The edits are only journaled if they give back exactly the text of
+        # the editor, otherwise the whole note is written
+        text = self.te_contenu.toPlainText()
+        deltas, self.deltas = self.deltas, []
+        journaled = deltas_match(self.dirty_note.content, deltas, text)
+
+        # The writer keeps the text in the content cache until it is written,
+        # then the least recently used notes can be dropped again
+        self.dirty_note.content = text
+        self.writer.save(self.dirty_note, deltas if journaled else None)
+        self.dirty_note.content = None
+        self.dirty_note = None
+
+    def closeEvent(self, event):
+        self.save_note()
+        self.writer.stop()
+        note_api.listeners.remove(self.search_index)
+        self.search_index.stop()
+        event.accept()
 
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import sqlite3
+import argparse
+import platform
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import package.api.task
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+PROC_IO = "/proc/self/io"
+
+# Every write of the API is logged, which would be measured along with it
+logging.disable(logging.INFO)
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = max(0, round(percent / 100 * len(sorted_values)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def bytes_written():
+    # wchar counts every byte handed to write(), page cache or not; the size of
+    # the database files is used where /proc is not available
+    if os.path.exists(PROC_IO):
+        with open(PROC_IO, "r") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    directory = os.path.dirname(package.api.task.TASKS_FILEPATH)
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+def use_directory(directory):
+    package.api.task.TASKS_DIR = directory
+    package.api.task.TASKS_FILEPATH = os.path.join(directory, "tasks.db")
+
+
+def measure(operation, function, arguments):
+    latencies = []
+    start_bytes = bytes_written()
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        latencies.append(time.perf_counter() - start)
+    written = bytes_written() - start_bytes
+    return summarize(operation, latencies, written)
+
+
+def summarize(operation, latencies, written=None):
+    latencies = sorted(latencies)
+    return {"operation": operation,
+            "count": len(latencies),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+            "bytes_per_op": round(written / len(latencies)) if written is not None and latencies else None}
+
+
+def run_size(size, count, directory):
+    use_directory(directory)
+    api = package.api.task
+    api.add_tasks([f"tâche {index}" for index in range(size)])
+    names = [f"tâche {index}" for index in range(count)]
+    new_names = [f"nouvelle tâche {index}" for index in range(count)]
+
+    # A write from another connection forces get_tasks to read the table again
+    other = sqlite3.connect(api.TASKS_FILEPATH, timeout=10)
+
+    def cold_get(index):
+        other.execute("UPDATE tasks SET done = 1 - done WHERE id = 1")
+        other.commit()
+        start = time.perf_counter()
+        api.get_tasks()
+        return time.perf_counter() - start
+
+    results = [measure("get", lambda _: api.get_tasks(), range(count)),
+               summarize("get_cold", [cold_get(index) for index in range(count)]),
+               measure("add", api.add_task, new_names),
+               measure("set_status", lambda name: api.set_task_status(name, done=True), names),
+               measure("queue_status", lambda name: api.queue_task_status(name, done=False), names),
+               measure("flush", lambda _: api.flush(), range(1)),
+               measure("remove", api.remove_task, new_names)]
+    other.close()
+
+    # Cleanup of 10 % of the list, done in one call like MainWindow.clean_task
+    done_names = [f"tâche {index}" for index in range(0, size, 10)]
+    api.set_tasks_status(done_names, done=True)
+    results.append(measure("bulk_clean", lambda _: api.remove_tasks(done_names), range(1)))
+    for result in results:
+        result["size"] = size
+    return results
+
+
+def contention_worker(directory, worker, count, start_at):
+    # Several processes write to the same database at the same time
+    use_directory(directory)
+    api = package.api.task
+    names = [f"processus {worker} tâche {index}" for index in range(count)]
+    time.sleep(max(0.0, start_at - time.time()))
+
+    latencies = []
+    errors = 0
+    for name in names:
+        for function in (api.add_task, api.set_task_status, api.remove_task):
+            start = time.perf_counter()
+            try:
+                function(name)
+            except sqlite3.OperationalError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def run_contention(processes, count, size, directory):
+    use_directory(directory)
+    package.api.task.add_tasks([f"tâche {index}" for index in range(size)])
+    # Spawned workers open their own connection, as independent instances of
+    # the application would; a connection inherited through fork() is unsafe
+    start_at = time.time() + 1.0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        futures = [executor.submit(contention_worker, directory, worker, count, start_at)
+                   for worker in range(processes)]
+        outcomes = [future.result() for future in futures]
+
+    latencies = [latency for worker_latencies, _ in outcomes for latency in worker_latencies]
+    result = summarize(f"contention x{processes}", latencies)
+    result["size"] = size
+    result["errors"] = sum(errors for _, errors in outcomes)
+    return result
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, "r") as f:
+        baseline = {(result["operation"], result["size"]): result for result in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\nComparaison avec {baseline_path}")
+    for result in results:
+        previous = baseline.get((result["operation"], result["size"]))
+        if not previous or not previous["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / previous["p50_ms"]
+        regressed = ratio > 1 + threshold
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{result['operation']:<16} {result['size']:>8} x{ratio:.2f}{flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mesure les performances du stockage des tâches.")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help="Nombres de tâches existantes à tester (défaut: 1000 10000 100000).")
+    parser.add_argument("-n", "--count", type=int, default=200, help="Opérations mesurées par cas (défaut: 200).")
+    parser.add_argument("-p", "--processes", type=int, default=2,
+                        help="Processus écrivant en même temps dans le scénario de concurrence (défaut: 2).")
+    parser.add_argument("-o", "--output", help="Enregistre les résultats dans ce fichier JSON.")
+    parser.add_argument("-b", "--baseline", help="Fichier JSON de référence à comparer.")
+    parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                        help="Hausse de latence tolérée avant de signaler une régression (défaut: 0.2).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    print(f"{'opération':<16} {'tâches':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'octets/op':>10}")
+    for size in args.sizes:
+        cases = [lambda directory: run_size(size, args.count, directory),
+                 lambda directory: [run_contention(args.processes, args.count, size, directory)]]
+        for case in cases:
+            directory = tempfile.mkdtemp(prefix="pytasks_bench_")
+            try:
+                for result in case(directory):
+                    results.append(result)
+                    print(f"{result['operation']:<16} {size:>8} {result['p50_ms']:>9} {result['p99_ms']:>9} "
+                          f"{result['max_ms']:>9} {result['bytes_per_op']!s:>10}")
+            finally:
+                shutil.rmtree(directory)
+
+    if args.output:
+        data = {"python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "count": args.count,
+                "results": results}
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=4)
+
+    if args.baseline:
+        return 1 if compare(results, args.baseline, args.threshold) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
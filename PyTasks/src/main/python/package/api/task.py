@@ -1,66 +1,239 @@
 import os
 from pathlib import Path
 import logging
+import csv
 import json
+import sqlite3
+import atexit
+import threading
+from contextlib import contextmanager
 
 logging.basicConfig(level=logging.DEBUG)
 
 TASKS_DIR = os.path.join(Path.home(), ".todo")
-TASKS_FILEPATH = os.path.join(TASKS_DIR, "tasks.json")
+TASKS_FILEPATH = os.path.join(TASKS_DIR, "tasks.db")
+LEGACY_TASKS_FILENAME = "tasks.json"
+FLUSH_DELAY = 0.5
+
+_connection = None
+_connection_path = None
+_lock = threading.RLock()
+_cache = None
+_cache_version = None
+_pending = {}
+_flush_timer = None
 
 
 def get_tasks():
-    if os.path.exists(TASKS_FILEPATH):
-        with open(TASKS_FILEPATH, "r") as f:
-            return json.load(f)
-    else:
-        return {}
+    # The tasks are kept in memory and only read again when another
+    # connection (another instance of the application) changed the database
+    global _cache, _cache_version
+    with _lock:
+        connection = _get_connection()
+        version = connection.execute("PRAGMA data_version").fetchone()[0]
+        if _cache is None or version != _cache_version:
+            rows = connection.execute("SELECT name, done FROM tasks ORDER BY id").fetchall()
+            _cache = {name: bool(done) for name, done in rows}
+            _cache.update((name, done) for name, done in _pending.items() if name in _cache)
+            _cache_version = version
+        return dict(_cache)
 
 
 def add_task(name):
-    tasks = get_tasks()
-    if name in tasks.keys():
+    try:
+        with _transaction() as connection:
+            connection.execute("INSERT INTO tasks (name, done) VALUES (?, 0)", (name,))
+            _update_cache(lambda cache: cache.setdefault(name, False))
+    except sqlite3.IntegrityError:
         logging.error("Une tâche avec le même nom existe déjà.")
         return False
-
-    tasks[name] = False
-    _write_tasks_to_disk(tasks=tasks)
     return True
 
 
 def remove_task(name):
-    tasks = get_tasks()
-    if name not in tasks.keys():
+    with _transaction() as connection:
+        removed = connection.execute("DELETE FROM tasks WHERE name = ?", (name,)).rowcount
+        _update_cache(lambda cache: cache.pop(name, None))
+    if not removed:
         logging.error("La tâche n'existe pas dans le dictionnaire.")
         return False
-
-    del tasks[name]
-    _write_tasks_to_disk(tasks=tasks)
     return True
 
 
 def set_task_status(name, done=True):
-    tasks = get_tasks()
-    if name not in tasks.keys():
+    with _transaction() as connection:
+        updated = connection.execute("UPDATE tasks SET done = ? WHERE name = ?", (int(done), name)).rowcount
+        _update_cache(lambda cache: _set_cached_status(cache, [name], done))
+    if not updated:
         logging.error("La tâche n'existe pas.")
         return False
-
-    tasks[name] = done
-    _write_tasks_to_disk(tasks=tasks)
     return True
 
 
-def _write_tasks_to_disk(tasks):
-    if not os.path.exists(TASKS_DIR):
-        os.makedirs(TASKS_DIR)
-
-    with open(TASKS_FILEPATH, "w") as f:
-        json.dump(tasks, f, indent=4)
+def add_tasks(names):
+    # Names that already exist or appear twice are ignored
+    names = list(names)
+    with _transaction() as connection:
+        before = connection.total_changes
+        connection.executemany("INSERT OR IGNORE INTO tasks (name, done) VALUES (?, 0)",
+                               ((name,) for name in names))
+        added = connection.total_changes - before
+        _update_cache(lambda cache: [cache.setdefault(name, False) for name in names])
+    logging.info(f"{added} tâches ont été ajoutées.")
+    return added
+
+
+def remove_tasks(names):
+    names = list(names)
+    with _transaction() as connection:
+        before = connection.total_changes
+        connection.executemany("DELETE FROM tasks WHERE name = ?", ((name,) for name in names))
+        removed = connection.total_changes - before
+        _update_cache(lambda cache: [cache.pop(name, None) for name in names])
+    logging.info(f"{removed} tâches ont été supprimées.")
+    return removed
+
+
+def set_tasks_status(names, done=True):
+    names = list(names)
+    with _transaction() as connection:
+        before = connection.total_changes
+        connection.executemany("UPDATE tasks SET done = ? WHERE name = ?",
+                               ((int(done), name) for name in names))
+        updated = connection.total_changes - before
+        _update_cache(lambda cache: _set_cached_status(cache, names, done))
+    return updated
+
+
+def import_tasks(filepath):
+    # A text file holds one task per line; a CSV file holds the name in the
+    # first column and optionally the status in the second one
+    if os.path.splitext(filepath)[1].lower() == ".csv":
+        with open(filepath, "r", newline="", encoding="utf-8") as f:
+            rows = [row for row in csv.reader(f) if row and row[0].strip()]
+        tasks = {row[0].strip(): len(row) > 1 and row[1].strip().lower() in ("1", "true", "oui", "x")
+                 for row in rows}
+    else:
+        with open(filepath, "r", encoding="utf-8") as f:
+            tasks = {line.strip(): False for line in f if line.strip()}
+
+    with _transaction() as connection:
+        before = connection.total_changes
+        connection.executemany("INSERT OR IGNORE INTO tasks (name, done) VALUES (?, ?)",
+                               ((name, int(done)) for name, done in tasks.items()))
+        imported = connection.total_changes - before
+        _update_cache(lambda cache: [cache.setdefault(name, done) for name, done in tasks.items()])
+    logging.info(f"{imported} tâches ont été importées depuis {filepath}.")
+    return imported
+
+
+def queue_task_status(name, done=True):
+    # Status changes from the interface are only kept in memory, then written
+    # together by a background thread once clicks stop for FLUSH_DELAY
+    global _flush_timer
+    with _lock:
+        _pending[name] = done
+        _update_cache(lambda cache: _set_cached_status(cache, [name], done))
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+        _flush_timer = threading.Timer(FLUSH_DELAY, flush)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+def flush():
+    global _flush_timer
+    with _lock:
+        if _flush_timer is not None:
+            _flush_timer.cancel()
+            _flush_timer = None
+        if _pending:
+            with _transaction():
+                pass
+
+
+@contextmanager
+def _transaction():
+    # Every change is a single SQLite transaction: it is either fully on disk
+    # or not at all, even if the application is killed mid-write. Queued status
+    # changes are written first, in the same transaction.
+    global _cache
+    with _lock:
+        connection = _get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if _pending:
+                connection.executemany("UPDATE tasks SET done = ? WHERE name = ?",
+                                       ((int(done), name) for name, done in _pending.items()))
+            yield connection
+            connection.execute("COMMIT")
+        except Exception:
+            _cache = None
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        _pending.clear()
         logging.info("Les tâches ont bien été mises à jour.")
 
 
+def _update_cache(function):
+    if _cache is not None:
+        function(_cache)
+
+
+def _set_cached_status(cache, names, done):
+    for name in names:
+        if name in cache:
+            cache[name] = done
+
+
+def _get_connection():
+    # The connection is reopened if TASKS_FILEPATH changes (tests, benchmarks)
+    global _connection, _connection_path, _cache
+    if _connection is not None and _connection_path == TASKS_FILEPATH:
+        return _connection
+
+    if _connection is not None:
+        _connection.close()
+    _cache = None
+
+    os.makedirs(os.path.dirname(TASKS_FILEPATH), exist_ok=True)
+    connection = sqlite3.connect(TASKS_FILEPATH, isolation_level=None, check_same_thread=False, timeout=10)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("""CREATE TABLE IF NOT EXISTS tasks (
+                              id INTEGER PRIMARY KEY AUTOINCREMENT,
+                              name TEXT NOT NULL UNIQUE,
+                              done INTEGER NOT NULL DEFAULT 0)""")
+    _connection, _connection_path = connection, TASKS_FILEPATH
+    _migrate_json()
+    return connection
+
+
+def _migrate_json():
+    legacy_path = os.path.join(os.path.dirname(TASKS_FILEPATH), LEGACY_TASKS_FILENAME)
+    if not os.path.exists(legacy_path):
+        return
+
+    try:
+        with open(legacy_path, "r") as f:
+            tasks = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Impossible de lire l'ancien fichier de tâches {legacy_path} : {e}")
+        return
+
+    with _transaction() as connection:
+        connection.executemany("INSERT OR IGNORE INTO tasks (name, done) VALUES (?, ?)",
+                               ((name, int(done)) for name, done in tasks.items()))
+    # The JSON file is kept under another name rather than deleted
+    os.replace(legacy_path, legacy_path + ".migrated")
+    logging.info(f"{len(tasks)} tâches ont été importées depuis {legacy_path}.")
+
+
+atexit.register(flush)
+
+
 if __name__ == '__main__':
     # add_task("Apprendre Python")
     # set_tasks_statut(name="Apprendre Python")
     remove_task(name="Apprendre Python")
-
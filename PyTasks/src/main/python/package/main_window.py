@@ -1,34 +1,7 @@
 from PySide2 import QtWidgets, QtCore, QtGui
 
 import package.api.task
-
-COLORS = {False: (235, 64, 52), True: (160, 237, 83)}
-
-
-class TaskItem(QtWidgets.QListWidgetItem):
-    def __init__(self, name, done, list_widget):
-        super().__init__(name)
-
-        self.list_widget = list_widget
-        self.done = done
-        self.name = name
-
-        self.setSizeHint(QtCore.QSize(self.sizeHint().width(), 50))
-        self.list_widget.addItem(self)
-        self.set_background_color()
-
-    def toggle_state(self):
-        self.done = not self.done
-        package.api.task.set_task_status(name=self.name, done=self.done)
-        self.set_background_color()
-
-    def set_background_color(self):
-        color = COLORS.get(self.done)
-        self.setBackgroundColor(QtGui.QColor(*color))
-        color_str = ", ".join(map(str, color))
-        stylesheet = f"""QListView::item:selected {{background: rgb({color_str});
-                                                    color: rgb(0, 0, 0);}}"""
-        self.list_widget.setStyleSheet(stylesheet)
+from package.task_list import TaskListModel, TaskDelegate
 
 
 class MainWindow(QtWidgets.QWidget):
@@ -48,8 +21,10 @@ class MainWindow(QtWidgets.QWidget):
         self.setup_connections()
 
     def create_widgets(self):
-        self.lw_tasks = QtWidgets.QListWidget()
+        self.lv_tasks = QtWidgets.QListView()
+        self.model = TaskListModel(parent=self)
         self.btn_add = QtWidgets.QPushButton()
+        self.btn_import = QtWidgets.QPushButton()
         self.btn_clean = QtWidgets.QPushButton()
         self.btn_quit = QtWidgets.QPushButton()
 
@@ -67,61 +42,78 @@ class MainWindow(QtWidgets.QWidget):
         self.setWindowFlags(QtCore.Qt.FramelessWindowHint | QtCore.Qt.WindowStaysOnTopHint)
 
         self.btn_add.setIcon(QtGui.QIcon(self.ctx.get_resource("add.svg")))
+        self.btn_import.setIcon(QtGui.QIcon(self.ctx.get_resource("import.svg")))
         self.btn_quit.setIcon(QtGui.QIcon(self.ctx.get_resource("close.svg")))
         self.btn_clean.setIcon(QtGui.QIcon(self.ctx.get_resource("clean.svg")))
 
         self.btn_add.setFixedSize(36, 36)
+        self.btn_import.setFixedSize(36, 36)
         self.btn_clean.setFixedSize(36, 36)
         self.btn_quit.setFixedSize(36, 36)
 
-        self.lw_tasks.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
-        self.lw_tasks.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.lv_tasks.setModel(self.model)
+        self.lv_tasks.setItemDelegate(TaskDelegate(self.lv_tasks))
+        self.lv_tasks.setUniformItemSizes(True)
+        self.lv_tasks.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.lv_tasks.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
 
     def create_layouts(self):
         self.main_layout = QtWidgets.QVBoxLayout(self)
         self.layout_buttons = QtWidgets.QHBoxLayout()
 
     def add_widgets_to_layouts(self):
-        self.main_layout.addWidget(self.lw_tasks)
+        self.main_layout.addWidget(self.lv_tasks)
         self.main_layout.addLayout(self.layout_buttons)
 
         self.layout_buttons.addWidget(self.btn_add)
+        self.layout_buttons.addWidget(self.btn_import)
         self.layout_buttons.addStretch()
         self.layout_buttons.addWidget(self.btn_clean)
         self.layout_buttons.addWidget(self.btn_quit)
 
     def setup_connections(self):
         self.btn_add.clicked.connect(self.add_task)
+        self.btn_import.clicked.connect(self.import_tasks)
         self.btn_clean.clicked.connect(self.clean_task)
         self.btn_quit.clicked.connect(self.close)
-        self.lw_tasks.itemClicked.connect(lambda lw_item: lw_item.toggle_state())
+        self.lv_tasks.clicked.connect(self.toggle_task)
         self.tray.activated.connect(self.tray_icon_click)
 
     def add_task(self):
         task_name, ok = QtWidgets.QInputDialog.getText(self,
                                                        "Ajouter une tâche",
                                                        "Nom de la tâche :")
-        if ok and task_name:
-            package.api.task.add_task(name=task_name)
+        if ok and task_name and package.api.task.add_task(name=task_name):
+            self.model.add_tasks({task_name: False})
+
+    def closeEvent(self, event):
+        package.api.task.flush()
+        event.accept()
+
+    def import_tasks(self):
+        filepath, _ = QtWidgets.QFileDialog.getOpenFileName(self,
+                                                            "Importer des tâches",
+                                                            "",
+                                                            "Tâches (*.txt *.csv)")
+        if filepath:
+            package.api.task.import_tasks(filepath=filepath)
             self.get_tasks()
 
     def clean_task(self):
-        for i in range(self.lw_tasks.count()):
-            lw_item = self.lw_tasks.item(i)
-            if lw_item.done:
-                package.api.task.remove_task(name=lw_item.name)
+        done_tasks = self.model.done_names()
+        package.api.task.remove_tasks(names=done_tasks)
+        self.model.remove_tasks(done_tasks)
 
-        self.get_tasks()
-        self.lw_tasks.repaint()
+    def toggle_task(self, index):
+        name, done = self.model.toggle(index.row())
+        package.api.task.queue_task_status(name=name, done=done)
 
     def get_tasks(self):
-        self.lw_tasks.clear()
-        tasks = package.api.task.get_tasks()
-        for task_name, done in tasks.items():
-            TaskItem(name=task_name, done=done, list_widget=self.lw_tasks)
+        self.model.set_tasks(package.api.task.get_tasks())
 
     def tray_icon_click(self):
         if self.isHidden():
+            self.get_tasks()
             self.showNormal()
             self.center_under_tray()
         else:
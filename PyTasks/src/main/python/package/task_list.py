@@ -0,0 +1,110 @@
+from PySide2 import QtWidgets, QtCore, QtGui
+
+COLORS = {False: (235, 64, 52), True: (160, 237, 83)}
+DONE_ROLE = QtCore.Qt.UserRole
+ROW_HEIGHT = 50
+
+
+class TaskListModel(QtCore.QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._names = []
+        self._done = {}
+        self._rows = {}
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._names)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        name = self._names[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return name
+        if role == DONE_ROLE:
+            return self._done[name]
+        return None
+
+    def name(self, row):
+        return self._names[row]
+
+    def done_names(self):
+        return [name for name in self._names if self._done[name]]
+
+    def set_tasks(self, tasks):
+        # Only the differences with the displayed list are applied, so the
+        # view keeps its selection and scroll position
+        self.remove_tasks([name for name in self._names if name not in tasks])
+        changed = [name for name, done in tasks.items() if name in self._done and self._done[name] != done]
+        for name in changed:
+            self.set_done(name, tasks[name])
+        self.add_tasks({name: done for name, done in tasks.items() if name not in self._done})
+
+    def add_tasks(self, tasks):
+        tasks = {name: done for name, done in tasks.items() if name not in self._done}
+        if not tasks:
+            return
+
+        first_row = len(self._names)
+        self.beginInsertRows(QtCore.QModelIndex(), first_row, first_row + len(tasks) - 1)
+        for row, (name, done) in enumerate(tasks.items(), start=first_row):
+            self._names.append(name)
+            self._done[name] = done
+            self._rows[name] = row
+        self.endInsertRows()
+
+    def remove_tasks(self, names):
+        # Cleaning the list removes every done task at once: adjacent tasks
+        # are grouped into runs, removed last run first, and the name -> row
+        # mapping is recomputed at the end
+        runs = []
+        for row in sorted(self._rows[name] for name in set(names) if name in self._rows):
+            if runs and runs[-1][1] == row - 1:
+                runs[-1][1] = row
+            else:
+                runs.append([row, row])
+
+        for first, last in reversed(runs):
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            for name in self._names[first:last + 1]:
+                del self._done[name]
+            del self._names[first:last + 1]
+            self.endRemoveRows()
+
+        if runs:
+            self._rows = {name: row for row, name in enumerate(self._names)}
+
+    def set_done(self, name, done):
+        row = self._rows.get(name)
+        if row is None:
+            return
+        self._done[name] = done
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [DONE_ROLE])
+
+    def toggle(self, row):
+        name = self._names[row]
+        self.set_done(name, not self._done[name])
+        return name, self._done[name]
+
+
+class TaskDelegate(QtWidgets.QStyledItemDelegate):
+    # The colors are painted directly instead of changing the stylesheet of
+    # the whole list every time an item changes
+    def paint(self, painter, option, index):
+        painter.save()
+        color = QtGui.QColor(*COLORS[index.data(DONE_ROLE)])
+        if option.state & QtWidgets.QStyle.State_Selected:
+            color = color.darker(110)
+        painter.fillRect(option.rect, color)
+        painter.setPen(QtGui.QColor(0, 0, 0))
+        painter.drawText(option.rect.adjusted(10, 0, -10, 0),
+                         QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter,
+                         index.data())
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(option.rect.width(), ROW_HEIGHT)